@@ -24,7 +24,8 @@ __author__ = 'Yoichi Tanibayashi'
 __date__   = '2020'
 
 import copy
-from midilib import Parser
+import bisect
+from midilib import Parser, VisualWriter
 from my_logger import get_logger
 
 
@@ -70,6 +71,7 @@ class MidiPaperTape:
         self._midi_data = midi_data
 
         self._data = self.mk_paper_tape(self._midi_data)
+        self._abs_time = sorted(self._data['ch_data'].keys())
 
     def mk_paper_tape(self, midi_data=None):
         """
@@ -140,38 +142,45 @@ class MidiPaperTape:
         Parameters
         ----------
         abs_time: float
+            any time [sec] (not only the key of ch_data)
+
+        Returns
+        -------
+        ch_data: list of str or None
+            line of the last event at/before ``abs_time``
+            (None: before the first event)
         """
         self.__log.debug('abs_time=%s', abs_time)
 
-        return self._data[abs_time]
+        i = bisect.bisect_right(self._abs_time, abs_time)
+        if i == 0:
+            return None
 
-    def print(self):
+        return self._data['ch_data'][self._abs_time[i - 1]]
+
+    def print(self, out=None):
         """
+        Parameters
+        ----------
+        out: file like object
+            default: sys.stdout
         """
-        n_range = range(self._data['note_min'], self._data['note_max']+1)
-
-        print('-' * (8 + 2 + len(n_range)))
-
-        print('        |', end='')
-        for i in n_range:
-            print('%d' % ((i/100) % 10), end='')
-        print('|')
-
-        print('        |', end='')
-        for i in n_range:
-            print('%d' % ((i/10) % 10), end='')
-        print('|')
-
-        print('        |', end='')
-        for i in n_range:
-            print('%d' % (i % 10), end='')
-        print('|')
-
-        print('-' * (8 + 2 + len(n_range)))
-
-        for t in sorted(self._data['ch_data'].keys()):
-            print('%08.3f|%s|' % (
-                t, ''.join(self._data['ch_data'][t])))
+        note_min = self._data['note_min']
+        note_max = self._data['note_max']
+        ch_data = self._data['ch_data']
+
+        line = '-' * (8 + 2 + max(note_max - note_min + 1, 0))
+
+        with VisualWriter(out, debug=self._dbg) as writer:
+            writer.write_lines(
+                [line] +
+                ['        |%s|' % (h)
+                 for h in writer.note_header(note_min, note_max)] +
+                [line])
+
+            abs_time = sorted(ch_data.keys())
+            writer.write_rows(abs_time,
+                              (''.join(ch_data[t]) for t in abs_time))
 
 
 # --- 以下、サンプル ---
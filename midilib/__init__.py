@@ -7,13 +7,35 @@ midi_tools
 __author__ = 'Yoichi Tanibayashi'
 __date__ = '2020/12'
 
-from .midi_utils import FREQ_BASE, NOTE_BASE, NOTE_N, note2freq
-from .midi_parser import Parser, NoteInfo
+from .midi_utils import FREQ_BASE, NOTE_BASE, NOTE_N, FREQ_TABLE
+from .midi_utils import note2freq, mk_freq_table
+from .note_info import NoteInfo
+from .interval_index import IntervalIndex
+from .note_table import NoteTable
+from .note_pairing import NotePairing
+from .smf_reader import SmfReader
+from .tempo_map import TempoMap
+from .piano_roll import PianoRoll
+from .visual_writer import VisualWriter
+from .parse_cache import ParseCache
+from .midi_parser import Parser
+from .sample_bank import SampleBank
+from .clock import Clock, VirtualClock
+from .play_metrics import PlayMetrics
+from .audio_backend import AudioBackend, PygameBackend, NullBackend
+from .audio_backend import RecordingBackend
 from .midi_player import Player
-from .wav_utils import Wav
+from .stream_player import StreamPlayer
+from .renderer import Renderer
+from .wav_utils import Wav, write_wav
 
 
-__all__ = ['FREQ_BASE', 'NOTE_BASE', 'NOTE_N', 'note2freq',
-           'Parser', 'NoteInfo',
-           'Player',
-           'Wav']
+__all__ = ['FREQ_BASE', 'NOTE_BASE', 'NOTE_N', 'FREQ_TABLE',
+           'note2freq', 'mk_freq_table',
+           'Parser', 'NoteInfo', 'NoteTable', 'IntervalIndex',
+           'NotePairing', 'SmfReader',
+           'TempoMap', 'PianoRoll', 'VisualWriter', 'ParseCache',
+           'SampleBank', 'Clock', 'VirtualClock', 'PlayMetrics',
+           'AudioBackend', 'PygameBackend', 'NullBackend', 'RecordingBackend',
+           'Player', 'StreamPlayer', 'Renderer',
+           'Wav', 'write_wav']
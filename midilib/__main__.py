@@ -4,14 +4,23 @@
 """
 main for midi_tools
 """
+import time
 import pygame
 import click
-from . import Parser, Player, Wav, note2freq
+from . import Parser, Player, StreamPlayer, Renderer, Wav, note2freq
+from . import NotePairing, SampleBank, PlayMetrics, NullBackend
+from .midi_utils import find_midi_files, mk_freq_table, FREQ_BASE
+from . import benchmark
 from .my_logger import get_logger
 
 
 class MidiApp:  # pylint: disable=too-many-instance-attributes
     """ MidiApp """
+    ENGINE_PYGAME = 'pygame'
+    ENGINE_SOUNDDEVICE = 'sounddevice'
+    ENGINE_NULL = 'null'
+    ENGINES = (ENGINE_PYGAME, ENGINE_SOUNDDEVICE, ENGINE_NULL)
+
     def __init__(self, midi_file,  # pylint: disable=too-many-arguments
                  channel,
                  parse_only=False,
@@ -19,6 +28,17 @@ class MidiApp:  # pylint: disable=too-many-instance-attributes
                  rate=Player.DEF_RATE,
                  sec_min=Player.SEC_MIN, sec_max=Player.SEC_MAX,
                  pos_sec=0,
+                 overlap=NotePairing.FIFO,
+                 reader=Parser.READER_MIDO,
+                 stream_flag=False,
+                 cache_dir=None,
+                 visual_out=None,
+                 engine=ENGINE_PYGAME,
+                 workers=None,
+                 bank_dir=None,
+                 spin=False,
+                 metrics_out=None,
+                 a4=FREQ_BASE,
                  debug=False) -> None:
         """ Constructor """
         self._dbg = debug
@@ -30,6 +50,16 @@ class MidiApp:  # pylint: disable=too-many-instance-attributes
         self._log.debug('rate=%s', rate)
         self._log.debug('sec_min/max=%s/%s', sec_min, sec_max)
         self._log.debug('pos_sec=%s', pos_sec)
+        self._log.debug('overlap=%s', overlap)
+        self._log.debug('reader=%s', reader)
+        self._log.debug('stream_flag=%s', stream_flag)
+        self._log.debug('cache_dir=%s', cache_dir)
+        self._log.debug('visual_out=%s', visual_out)
+        self._log.debug('engine=%s, workers=%s', engine, workers)
+        self._log.debug('bank_dir=%s', bank_dir)
+        self._log.debug('spin=%s', spin)
+        self._log.debug('metrics_out=%s', metrics_out)
+        self._log.debug('a4=%s', a4)
 
         self._midi_file = midi_file
         self._channel = channel
@@ -39,15 +69,57 @@ class MidiApp:  # pylint: disable=too-many-instance-attributes
         self._sec_min = sec_min
         self._sec_max = sec_max
         self._pos_sec = pos_sec
-
-        self._parser = Parser(debug=self._dbg)
-        self._player = Player(rate=self._rate, debug=self._dbg)
+        self._stream_flag = stream_flag
+        self._visual_out = visual_out
+        self._metrics_out = metrics_out
+
+        self._metrics = None
+        if metrics_out:
+            self._metrics = PlayMetrics()
+
+        self._parser = Parser(overlap=overlap, reader=reader,
+                              cache_dir=cache_dir, debug=self._dbg)
+        self._player = None
+        if not self._parse_only:
+            bank = None
+            if bank_dir or a4 != FREQ_BASE:
+                bank = SampleBank(cache_dir=bank_dir,
+                                  freq_table=mk_freq_table(a4),
+                                  debug=self._dbg)
+
+            if engine == self.ENGINE_SOUNDDEVICE:
+                if self._stream_flag:
+                    self._log.warning('--stream is ignored with %s',
+                                      engine)
+                    self._stream_flag = False
+
+                self._player = StreamPlayer(rate=self._rate,
+                                            sample_bank=bank,
+                                            debug=self._dbg)
+            else:
+                backend = None
+                if engine == self.ENGINE_NULL:
+                    backend = NullBackend(self._rate, debug=self._dbg)
+
+                self._player = Player(rate=self._rate, workers=workers,
+                                      sample_bank=bank, spin=spin,
+                                      metrics=self._metrics,
+                                      backend=backend,
+                                      debug=self._dbg)
 
     def main(self) -> None:
         """ main """
         self._log.debug('')
 
-        parsed_data = self._parser.parse(self._midi_file, self._channel)
+        if self._stream_flag and not self._parse_only:
+            self._player.play_stream(
+                self._parser.parse_iter(self._midi_file, self._channel),
+                self._pos_sec, self._sec_min, self._sec_max)
+            print('channel_set=', self._parser.channel_set(), flush=True)
+            return
+
+        parsed_data = self._parser.parse(self._midi_file, self._channel,
+                                         note_table=True)
 
         self._log.debug('parsed_data=')
         if self._dbg or self._parse_only:
@@ -55,8 +127,15 @@ class MidiApp:  # pylint: disable=too-many-instance-attributes
                 print('(%4d) %s' % (i, data))
 
         print('channel_set=', parsed_data['channel_set'], flush=True)
+        print('unmatched=', parsed_data['unmatched'], flush=True)
 
-        if self._visual_flag:
+        if self._visual_out:
+            v_data = self._parser.mk_visual(parsed_data['note_info'])
+            with open(self._visual_out, 'w') as f:
+                self._parser.print_visual(v_data,
+                                          parsed_data['channel_set'], f)
+
+        elif self._visual_flag:
             v_data = self._parser.mk_visual(parsed_data['note_info'])
             print()
             self._parser.print_visual(v_data, parsed_data['channel_set'])
@@ -67,6 +146,10 @@ class MidiApp:  # pylint: disable=too-many-instance-attributes
         self._player.play(parsed_data, self._pos_sec,
                           self._sec_min, self._sec_max)
 
+        if self._metrics is not None:
+            print(self._metrics)
+            self._metrics.dump(self._metrics_out)
+
     def end(self) -> None:
         """ end
 
@@ -134,6 +217,288 @@ class WavApp:  # pylint: disable=too-many-instance-attributes
         self._log.debug('done')
 
 
+class RenderApp:  # pylint: disable=too-many-instance-attributes
+    """ RenderApp
+
+    render MIDI file to wav file (no audio device)
+    """
+    def __init__(self, midi_file,  # pylint: disable=too-many-arguments
+                 outfile, channel,
+                 rate=Renderer.DEF_RATE,
+                 sec_min=Player.SEC_MIN, sec_max=Player.SEC_MAX,
+                 overlap=NotePairing.FIFO,
+                 reader=Parser.READER_MIDO,
+                 cache_dir=None,
+                 bank_dir=None,
+                 a4=FREQ_BASE,
+                 debug=False) -> None:
+        """ Constructor """
+        self._dbg = debug
+        self._log = get_logger(self.__class__.__name__, self._dbg)
+        self._log.debug('midi_file=%s, outfile=%s, channel=%s',
+                        midi_file, outfile, channel)
+        self._log.debug('bank_dir=%s, a4=%s', bank_dir, a4)
+        self._log.debug('rate=%s', rate)
+        self._log.debug('sec_min/max=%s/%s', sec_min, sec_max)
+
+        self._midi_file = midi_file
+        self._outfile = outfile
+        self._channel = channel
+        self._rate = rate
+
+        self._parser = Parser(overlap=overlap, reader=reader,
+                              cache_dir=cache_dir, debug=self._dbg)
+        bank = None
+        if bank_dir or a4 != FREQ_BASE:
+            bank = SampleBank(cache_dir=bank_dir,
+                              freq_table=mk_freq_table(a4),
+                              debug=self._dbg)
+
+        self._renderer = Renderer(sec_min, sec_max, sample_bank=bank,
+                                  debug=self._dbg)
+
+    def main(self) -> None:
+        """ main """
+        self._log.debug('')
+
+        start = time.perf_counter()
+
+        parsed_data = self._parser.parse(self._midi_file, self._channel,
+                                         note_table=True)
+        sec = self._renderer.save(self._outfile, parsed_data, self._rate)
+
+        elapsed = time.perf_counter() - start
+
+        print('%s: %.3f sec (rendered in %.3f sec)' % (
+            self._outfile, sec, elapsed))
+
+    def end(self) -> None:
+        """ end
+
+        do nothing
+        """
+
+
+class ReaderCheckApp:
+    """ ReaderCheckApp
+
+    compare parsed data of 'native' reader with 'mido' reader
+    """
+    def __init__(self, path, debug=False) -> None:
+        """ Constructor
+
+        Parameters
+        ----------
+        path: list of str
+            MIDI files or directories
+        """
+        self._dbg = debug
+        self._log = get_logger(self.__class__.__name__, self._dbg)
+        self._log.debug('path=%s', path)
+
+        self._path = path
+
+        self._parser = {
+            reader: Parser(reader=reader, debug=self._dbg)
+            for reader in Parser.READERS
+        }
+
+    def compare(self, midi_file):
+        """
+        Returns
+        -------
+        (result, elapsed): (str or None, dict)
+            result: error message (None: same)
+            elapsed: {reader: sec}
+        """
+        parsed = {}
+        elapsed = {}
+        for reader, parser in self._parser.items():
+            start = time.perf_counter()
+            parsed[reader] = parser.parse(midi_file, note_table=True)
+            elapsed[reader] = time.perf_counter() - start
+
+        data1 = parsed[Parser.READER_MIDO]
+        data2 = parsed[Parser.READER_NATIVE]
+
+        if data1['channel_set'] != data2['channel_set']:
+            return ('channel_set: %s != %s' % (
+                data1['channel_set'], data2['channel_set']), elapsed)
+
+        tbl1 = data1['note_info']
+        tbl2 = data2['note_info']
+
+        if len(tbl1) != len(tbl2):
+            return ('len: %s != %s' % (len(tbl1), len(tbl2)), elapsed)
+
+        for name in ('abs_time', 'end_time', 'channel', 'note',
+                     'velocity'):
+            if (getattr(tbl1, name) != getattr(tbl2, name)).any():
+                return ('%s: differ' % (name), elapsed)
+
+        return (None, elapsed)
+
+    def main(self) -> int:
+        """ main
+
+        Returns
+        -------
+        n_err: int
+            number of files which differ
+        """
+        self._log.debug('')
+
+        n_err = 0
+        for midi_file in find_midi_files(self._path):
+            result, elapsed = self.compare(midi_file)
+
+            if result:
+                n_err += 1
+
+            print('%-4s %s (mido:%.3f, native:%.3f sec)%s' % (
+                'NG' if result else 'OK', midi_file,
+                elapsed[Parser.READER_MIDO],
+                elapsed[Parser.READER_NATIVE],
+                ' .. ' + result if result else ''))
+
+        return n_err
+
+    def end(self) -> None:
+        """ end
+
+        do nothing
+        """
+
+
+class BatchApp:  # pylint: disable=too-many-instance-attributes
+    """ BatchApp
+
+    parse many MIDI files on a process pool
+    """
+    def __init__(self, path,  # pylint: disable=too-many-arguments
+                 channel, workers=None,
+                 overlap=NotePairing.FIFO,
+                 reader=Parser.READER_MIDO,
+                 cache_dir=None,
+                 debug=False) -> None:
+        """ Constructor
+
+        Parameters
+        ----------
+        path: list of str
+            MIDI files or directories
+        """
+        self._dbg = debug
+        self._log = get_logger(self.__class__.__name__, self._dbg)
+        self._log.debug('path=%s, channel=%s', path, channel)
+        self._log.debug('workers=%s', workers)
+
+        self._path = path
+        self._channel = channel
+        self._workers = workers
+
+        self._parser = Parser(overlap=overlap, reader=reader,
+                              cache_dir=cache_dir, debug=self._dbg)
+
+    @staticmethod
+    def print_result(result) -> None:
+        """
+        print result of a file
+        """
+        if result['error']:
+            print('ERR  %s (%.3f sec) .. %s' % (
+                result['midi_file'], result['sec'], result['error']),
+                  flush=True)
+            return
+
+        print('OK   %s (%.3f sec) notes=%d channel_set=%s' % (
+            result['midi_file'], result['sec'], len(result['note_info']),
+            sorted(result['channel_set'])), flush=True)
+
+    def main(self) -> int:
+        """ main
+
+        Returns
+        -------
+        n_err: int
+            number of files which could not be parsed
+        """
+        self._log.debug('')
+
+        midi_files = find_midi_files(self._path)
+
+        start = time.perf_counter()
+        results = self._parser.parse_many(midi_files, self._channel,
+                                          self._workers,
+                                          callback=self.print_result)
+        elapsed = time.perf_counter() - start
+
+        n_err = len([r for r in results if r['error']])
+        n_notes = sum(len(r['note_info']) for r in results
+                      if not r['error'])
+
+        print('files=%d, errors=%d, notes=%d, %.3f sec' % (
+            len(results), n_err, n_notes, elapsed))
+
+        return n_err
+
+    def end(self) -> None:
+        """ end
+
+        do nothing
+        """
+
+
+class BenchApp:
+    """ BenchApp """
+    TARGET = {
+        'note_info': benchmark.bench_note_info,
+        'wav': benchmark.bench_wav,
+        'play': benchmark.bench_play,
+        'interval': benchmark.bench_interval,
+        'logging': benchmark.bench_logging,
+    }
+
+    def __init__(self, target, path, repeat=3, debug=False) -> None:
+        """ Constructor
+
+        Parameters
+        ----------
+        target: str
+            benchmark target (key of ``BenchApp.TARGET``)
+        path: list of str
+            MIDI files or directories
+        """
+        self._dbg = debug
+        self._log = get_logger(self.__class__.__name__, self._dbg)
+        self._log.debug('target=%s, path=%s', target, path)
+
+        self._target = target
+        self._path = path
+        self._repeat = repeat
+
+    def main(self) -> None:
+        """ main """
+        self._log.debug('')
+
+        midi_files = find_midi_files(self._path)
+
+        result = self.TARGET[self._target](midi_files, self._repeat)
+
+        for row in result:
+            print('  '.join([
+                '%s=%.3f' % (k, v) if isinstance(v, float)
+                else '%s=%s' % (k, v)
+                for k, v in row.items()
+            ]))
+
+    def end(self) -> None:
+        """ end
+
+        do nothing
+        """
+
+
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
 
@@ -161,9 +526,24 @@ MIDI parser
 @click.option('--visual', '-v', 'visual_flag', is_flag=True,
               default=False,
               help='Visual flag')
+@click.option('--overlap', '-o', 'overlap',
+              type=click.Choice(NotePairing.POLICIES),
+              default=NotePairing.FIFO,
+              help='overlap policy, default=%s' % NotePairing.FIFO)
+@click.option('--reader', 'reader',
+              type=click.Choice(Parser.READERS),
+              default=Parser.READER_MIDO,
+              help='MIDI file reader, default=%s' % Parser.READER_MIDO)
+@click.option('--cache_dir', 'cache_dir', type=click.Path(),
+              help='parse cache directory')
+@click.option('--visual_out', '--visual-out', 'visual_out',
+              type=click.Path(dir_okay=False, writable=True),
+              help='write visual to file')
 @click.option('--debug', '-d', 'dbg', is_flag=True, default=False,
               help='debug flag')
-def parse(midi_file, channel, visual_flag, dbg) -> None:
+def parse(midi_file,  # pylint: disable=too-many-arguments
+          channel, visual_flag, overlap, reader, cache_dir, visual_out,
+          dbg) -> None:
     """
     parser main
     """
@@ -171,7 +551,8 @@ def parse(midi_file, channel, visual_flag, dbg) -> None:
 
     app = MidiApp(midi_file, channel, parse_only=True,
                   visual_flag=visual_flag,
-                  debug=dbg)
+                  overlap=overlap, reader=reader, cache_dir=cache_dir,
+                  visual_out=visual_out, debug=dbg)
     try:
         app.main()
     finally:
@@ -196,10 +577,39 @@ MIDI player
 @click.option('--sec_max', '--max', 'sec_max', type=float,
               default=Player.SEC_MAX,
               help='max sound length, default=%s' % (Player.SEC_MAX))
+@click.option('--overlap', '-o', 'overlap',
+              type=click.Choice(NotePairing.POLICIES),
+              default=NotePairing.FIFO,
+              help='overlap policy, default=%s' % NotePairing.FIFO)
+@click.option('--reader', 'reader',
+              type=click.Choice(Parser.READERS),
+              default=Parser.READER_MIDO,
+              help='MIDI file reader, default=%s' % Parser.READER_MIDO)
+@click.option('--stream', 'stream_flag', is_flag=True, default=False,
+              help='play while parsing')
+@click.option('--cache_dir', 'cache_dir', type=click.Path(),
+              help='parse cache directory')
+@click.option('--engine', '-e', 'engine',
+              type=click.Choice(MidiApp.ENGINES),
+              default=MidiApp.ENGINE_PYGAME,
+              help='audio engine, default=%s' % MidiApp.ENGINE_PYGAME)
+@click.option('--workers', '-w', 'workers', type=int, default=None,
+              help='number of threads to make sounds')
+@click.option('--bank_dir', 'bank_dir', type=click.Path(),
+              help='sample bank directory')
+@click.option('--spin', 'spin', is_flag=True, default=False,
+              help='spin-wait for accurate timing')
+@click.option('--metrics', 'metrics_out',
+              type=click.Path(dir_okay=False, writable=True),
+              help='write timing metrics to JSON file')
+@click.option('--a4', 'a4', type=float, default=FREQ_BASE,
+              help='frequency of A4 [Hz], default=%s' % FREQ_BASE)
 @click.option('--debug', '-d', 'dbg', is_flag=True, default=False,
               help='debug flag')
 def play(midi_file,  # pylint: disable=too-many-arguments
-         pos_sec, channel, rate, sec_min, sec_max, dbg) -> None:
+         pos_sec, channel, rate, sec_min, sec_max, overlap, reader,
+         stream_flag, cache_dir, engine, workers, bank_dir, spin,
+         metrics_out, a4, dbg) -> None:
     """
     player main
     """
@@ -208,7 +618,10 @@ def play(midi_file,  # pylint: disable=too-many-arguments
     app = MidiApp(midi_file, channel, parse_only=False,
                   visual_flag=False, rate=rate,
                   sec_min=sec_min, sec_max=sec_max, pos_sec=pos_sec,
-                  debug=dbg)
+                  overlap=overlap, reader=reader,
+                  stream_flag=stream_flag, cache_dir=cache_dir,
+                  engine=engine, workers=workers, bank_dir=bank_dir,
+                  spin=spin, metrics_out=metrics_out, a4=a4, debug=dbg)
     try:
         app.main()
     finally:
@@ -259,5 +672,147 @@ def wav(freq, outfile,  # pylint: disable=too-many-arguments
         app.end()
 
 
+@cli.command(context_settings=CONTEXT_SETTINGS, help='''
+render MIDI file to wav file
+''')
+@click.argument('midi_file', type=click.Path(exists=True))
+@click.argument('outfile', type=click.Path(dir_okay=False, writable=True))
+@click.option('--channel', '-c', 'channel', type=int, multiple=True,
+              help='MIDI channel')
+@click.option('--rate', '-r', 'rate', type=int,
+              default=Renderer.DEF_RATE,
+              help='sampling rate, default=%s Hz' % Renderer.DEF_RATE)
+@click.option('--sec_min', '--min', 'sec_min', type=float,
+              default=Player.SEC_MIN,
+              help='min sound length, default=%s' % (Player.SEC_MIN))
+@click.option('--sec_max', '--max', 'sec_max', type=float,
+              default=Player.SEC_MAX,
+              help='max sound length, default=%s' % (Player.SEC_MAX))
+@click.option('--overlap', '-o', 'overlap',
+              type=click.Choice(NotePairing.POLICIES),
+              default=NotePairing.FIFO,
+              help='overlap policy, default=%s' % NotePairing.FIFO)
+@click.option('--reader', 'reader',
+              type=click.Choice(Parser.READERS),
+              default=Parser.READER_MIDO,
+              help='MIDI file reader, default=%s' % Parser.READER_MIDO)
+@click.option('--cache_dir', 'cache_dir', type=click.Path(),
+              help='parse cache directory')
+@click.option('--bank_dir', 'bank_dir', type=click.Path(),
+              help='sample bank directory')
+@click.option('--a4', 'a4', type=float, default=FREQ_BASE,
+              help='frequency of A4 [Hz], default=%s' % FREQ_BASE)
+@click.option('--debug', '-d', 'dbg', is_flag=True, default=False,
+              help='debug flag')
+def render(midi_file,  # pylint: disable=too-many-arguments
+           outfile, channel, rate, sec_min, sec_max, overlap, reader,
+           cache_dir, bank_dir, a4, dbg) -> None:
+    """
+    render main
+    """
+    log = get_logger(__name__, dbg)
+
+    app = RenderApp(midi_file, outfile, channel, rate, sec_min, sec_max,
+                    overlap=overlap, reader=reader, cache_dir=cache_dir,
+                    bank_dir=bank_dir, a4=a4, debug=dbg)
+    try:
+        app.main()
+    finally:
+        log.debug('finally')
+        app.end()
+
+
+@cli.command(name='parse-batch', context_settings=CONTEXT_SETTINGS,
+             help='''
+MIDI parser for many files (directories are searched recursively)
+''')
+@click.argument('path', type=click.Path(exists=True), nargs=-1,
+                required=True)
+@click.option('--workers', '-w', 'workers', type=int, default=None,
+              help='number of worker processes, default=number of CPUs')
+@click.option('--channel', '-c', 'channel', type=int, multiple=True,
+              help='MIDI channel')
+@click.option('--overlap', '-o', 'overlap',
+              type=click.Choice(NotePairing.POLICIES),
+              default=NotePairing.FIFO,
+              help='overlap policy, default=%s' % NotePairing.FIFO)
+@click.option('--reader', 'reader',
+              type=click.Choice(Parser.READERS),
+              default=Parser.READER_MIDO,
+              help='MIDI file reader, default=%s' % Parser.READER_MIDO)
+@click.option('--cache_dir', 'cache_dir', type=click.Path(),
+              help='parse cache directory')
+@click.option('--debug', '-d', 'dbg', is_flag=True, default=False,
+              help='debug flag')
+def parse_batch(path,  # pylint: disable=too-many-arguments
+                workers, channel, overlap, reader, cache_dir, dbg) -> None:
+    """
+    batch parser main
+    """
+    log = get_logger(__name__, dbg)
+
+    app = BatchApp(path, channel, workers=workers,
+                   overlap=overlap, reader=reader, cache_dir=cache_dir,
+                   debug=dbg)
+    try:
+        n_err = app.main()
+    finally:
+        log.debug('finally')
+        app.end()
+
+    if n_err:
+        raise click.ClickException('%d file(s) could not be parsed' % (
+            n_err))
+
+
+@cli.command(name='check-reader', context_settings=CONTEXT_SETTINGS,
+             help='''
+compare 'native' reader with 'mido' reader
+''')
+@click.argument('path', type=click.Path(exists=True), nargs=-1,
+                required=True)
+@click.option('--debug', '-d', 'dbg', is_flag=True, default=False,
+              help='debug flag')
+def check_reader(path, dbg) -> None:
+    """
+    reader check main
+    """
+    log = get_logger(__name__, dbg)
+
+    app = ReaderCheckApp(path, debug=dbg)
+    try:
+        n_err = app.main()
+    finally:
+        log.debug('finally')
+        app.end()
+
+    if n_err:
+        raise click.ClickException('%d file(s) differ' % (n_err))
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS, help='''
+benchmark
+''')
+@click.argument('target', type=click.Choice(sorted(BenchApp.TARGET)))
+@click.argument('path', type=click.Path(exists=True), nargs=-1,
+                required=True)
+@click.option('--repeat', '-n', 'repeat', type=int, default=3,
+              help='number of repeat, default=3')
+@click.option('--debug', '-d', 'dbg', is_flag=True, default=False,
+              help='debug flag')
+def bench(target, path, repeat, dbg) -> None:
+    """
+    benchmark main
+    """
+    log = get_logger(__name__, dbg)
+
+    app = BenchApp(target, path, repeat, debug=dbg)
+    try:
+        app.main()
+    finally:
+        log.debug('finally')
+        app.end()
+
+
 if __name__ == '__main__':
     cli(prog_name='MidiLib')
@@ -0,0 +1,178 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Audio backends for Player
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import time
+import pygame
+from .clock import Clock
+from .my_logger import get_logger
+
+
+class AudioBackend:
+    """
+    Audio backend interface
+
+    ``Player`` は、音の作成と再生を backend に任せる。
+
+    * ``PygameBackend``: pygame.mixer (default)
+    * ``NullBackend``: 何もしない(オーディオデバイスが無くても動く)
+    * ``RecordingBackend``: 再生要求を記録する(テスト用)
+    """
+    NAME = None
+
+    def make_sound(self, wav):
+        """
+        Parameters
+        ----------
+        wav: np.ndarray of int16
+
+        Returns
+        -------
+        snd: any
+            sound object of the backend
+        """
+        raise NotImplementedError
+
+    def play(self, key, snd, vol):
+        """
+        Parameters
+        ----------
+        key: tuple
+            (note_num, key_sec)
+        snd: any
+            return value of ``make_sound()``
+        vol: float
+            0.0 .. 1.0
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        wait for the end of playing sounds
+        """
+
+    def pause(self):
+        """
+        pause all playing sounds
+        """
+
+    def resume(self):
+        """
+        resume paused sounds
+        """
+
+    def stop(self):
+        """
+        stop all playing sounds
+        """
+
+    def close(self):
+        """
+        release resources
+        """
+
+
+class PygameBackend(AudioBackend):
+    """
+    pygame.mixer backend
+    """
+    NAME = 'pygame'
+
+    END_WAIT = 0.5  # sec
+
+    def __init__(self, rate, debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        rate: int
+            sampling rate [Hz]
+        """
+        self._dbg = debug
+        self.__log = get_logger(__class__.__name__, self._dbg)
+        self.__log.debug('rate=%s', rate)
+
+        pygame.mixer.init(frequency=rate, channels=1)
+
+    def make_sound(self, wav):
+        return pygame.sndarray.make_sound(wav)
+
+    def play(self, key, snd, vol):
+        snd.set_volume(vol)
+        snd.play()
+
+    def finish(self):
+        time.sleep(self.END_WAIT)
+
+    def pause(self):
+        pygame.mixer.pause()
+
+    def resume(self):
+        pygame.mixer.unpause()
+
+    def stop(self):
+        pygame.mixer.stop()
+
+    def close(self):
+        pygame.mixer.quit()
+
+
+class NullBackend(AudioBackend):
+    """
+    backend which plays nothing
+    """
+    NAME = 'null'
+
+    def __init__(self, rate=None, debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        rate: int
+            (not used)
+        """
+        self._dbg = debug
+        self.__log = get_logger(__class__.__name__, self._dbg)
+        self.__log.debug('rate=%s', rate)
+
+    def make_sound(self, wav):
+        return wav
+
+    def play(self, key, snd, vol):
+        pass
+
+
+class RecordingBackend(NullBackend):
+    """
+    backend which records play requests
+
+    Attributes
+    ----------
+    records: list of (float, tuple, float)
+        [(timestamp, key, vol), ..]
+        timestamp: ``clock.now()``
+    """
+    NAME = 'recording'
+
+    def __init__(self, rate=None, clock=None, debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        rate: int
+            (not used)
+        clock: Clock or None
+            clock of timestamp (None: ``Clock``)
+        """
+        super().__init__(rate, debug)
+
+        self._clock = clock if clock is not None else Clock()
+        self.records = []
+
+    def play(self, key, snd, vol):
+        self.records.append((self._clock.now(), key, vol))
@@ -0,0 +1,454 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Benchmarks
+
+### usage
+
+$ python -m midilib bench note_info sample_midi
+$ python -m midilib bench wav sample_midi
+$ python -m midilib bench play sample_midi
+$ python -m midilib bench interval sample_midi
+$ python -m midilib bench logging sample_midi
+
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import io
+import sys
+import time
+import inspect
+import logging
+import contextlib
+import tracemalloc
+import numpy as np
+from .note_info import NoteInfo
+from .note_table import NoteTable
+from .midi_parser import Parser
+from .midi_player import Player
+from .audio_backend import RecordingBackend
+from .clock import VirtualClock
+from .midi_utils import note2freq
+from .wav_utils import Wav
+from .my_logger import get_logger, CONSOLE_HANDLER
+
+LONG_TONE = (440.0, 60.0, 48000)  # (freq, sec, rate)
+
+
+def legacy_get_logger(name, dbg=False):
+    """
+    ``get_logger()`` before caching (for comparison only)
+
+    ``inspect.stack()`` and ``addHandler()`` on every call.
+    """
+    filename = inspect.stack()[1].filename.split('/')[-1]
+    logger = logging.getLogger(filename + '.' + name)
+    logger.propagate = False
+    logger.addHandler(CONSOLE_HANDLER)
+    logger.setLevel(logging.DEBUG if dbg else logging.INFO)
+
+    return logger
+
+
+class LogCounter:
+    """
+    count calls of ``logging.Logger`` methods (for benchmark only)
+
+    Simple Usage
+    ------------
+    ============================================================
+    with LogCounter() as counter:
+        ...
+    print(counter.count)
+    ============================================================
+    """
+    METHODS = ('debug', 'info', 'warning', 'error')
+
+    def __init__(self):
+        """ Constructor """
+        self.count = 0
+        self._orig = {}
+
+    def __enter__(self):
+        for name in self.METHODS:
+            orig = getattr(logging.Logger, name)
+            self._orig[name] = orig
+
+            def counted(logger, *args, _orig=orig, **kwargs):
+                self.count += 1
+                return _orig(logger, *args, **kwargs)
+
+            setattr(logging.Logger, name, counted)
+
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        for name, orig in self._orig.items():
+            setattr(logging.Logger, name, orig)
+
+
+class LegacyNoteInfo:  # pylint: disable=too-few-public-methods
+    """
+    NoteInfo before ``__slots__`` (for comparison only)
+
+    ``__dict__`` based, with per-instance logger.
+    """
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 abs_time=None, channel=None, note=None,
+                 velocity=None, end_time=None, debug=False):
+        self._dbg = debug
+        self._log = legacy_get_logger(__class__.__name__, self._dbg)
+
+        self.abs_time = round(abs_time, 3)
+        self.channel = channel
+        self.note = note
+        self.velocity = velocity
+        self.end_time = None
+        if isinstance(end_time, float):
+            self.end_time = round(end_time, 3)
+
+
+def measure(func, repeat=3):
+    """
+    Parameters
+    ----------
+    func: function
+        function to be measured
+    repeat: int
+
+    Returns
+    -------
+    (sec, ret): (float, any)
+        best elapsed time [sec] and return value of the last call
+    """
+    sec = None
+    ret = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ret = func()
+        elapsed = time.perf_counter() - start
+
+        if sec is None or elapsed < sec:
+            sec = elapsed
+
+    return (sec, ret)
+
+
+def obj_size(obj):
+    """
+    Returns
+    -------
+    size: int
+        size of object and its ``__dict__`` [bytes]
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+
+    return size
+
+
+def bench_note_info(midi_files, repeat=3, n_max=1000):
+    """
+    per-note cost of NoteInfo: LegacyNoteInfo vs NoteInfo
+
+    Parameters
+    ----------
+    midi_files: list of str
+    repeat: int
+    n_max: int
+        max number of notes (sampled evenly from all files)
+
+    Returns
+    -------
+    result: list of dict
+        [{'name': str, 'n': int, 'usec': float, 'bytes': float}, ..]
+        per-note time [usec] and memory [bytes]
+    """
+    parser = Parser(reader=Parser.READER_NATIVE)
+
+    rows = []
+    for midi_file in midi_files:
+        table = parser.parse(midi_file, note_table=True)['note_info']
+        rows.extend(zip(table.abs_time.tolist(), table.channel.tolist(),
+                        table.note.tolist(), table.velocity.tolist(),
+                        table.end_time.tolist()))
+
+    rows = rows[::max(len(rows) // n_max, 1)][:n_max]
+    n_notes = max(len(rows), 1)
+
+    result = []
+    for cls in (LegacyNoteInfo, NoteInfo):
+        sec, data = measure(lambda c=cls: [c(*r) for r in rows], repeat)
+
+        result.append({
+            'name': cls.__name__,
+            'n': len(rows),
+            'usec': sec / n_notes * 1e6,
+            'bytes': sum(obj_size(d) for d in data) / n_notes
+        })
+
+    return result
+
+
+def bench_wav(midi_files, repeat=3, rate=Player.DEF_RATE):
+    """
+    sound synthesis: ``Wav.synth()`` (np.sin) vs ``Wav.synth_table()``
+
+    Sounds of all keys (note, key_sec) in the files, and a long tone
+    (``LONG_TONE``: freq, sec, rate) are made by each method.
+
+    Parameters
+    ----------
+    midi_files: list of str
+    repeat: int
+    rate: int
+        sampling rate of sounds of the files
+
+    Returns
+    -------
+    result: list of dict
+        [{'name': str, 'case': str, 'n': int, 'msec': float,
+          'peak_kb': float, 'err_max': int}, ..]
+        err_max: max difference from ``Wav.synth()``
+    """
+    parser = Parser(reader=Parser.READER_NATIVE)
+    player_keys = set()
+    for midi_file in midi_files:
+        table = parser.parse(midi_file, note_table=True)['note_info']
+        key_sec = Player.key_sec(table.length(), Player.SEC_MIN,
+                                 Player.SEC_MAX)
+        player_keys.update(zip(table.note.tolist(), key_sec.tolist()))
+
+    group = {}
+    for note, sec in sorted(player_keys):
+        group.setdefault(sec, []).append(note2freq(note))
+
+    cases = {
+        'keys': [(freq, sec, rate) for sec, freq in group.items()],
+        'long': [LONG_TONE],
+    }
+
+    result = []
+    for case, args in cases.items():
+        ref = [Wav.synth(*a) for a in args]
+
+        for name, func in (('sin', Wav.synth),
+                           ('table', Wav.synth_table)):
+            sec, data = measure(lambda f=func: [f(*a) for a in args],
+                                repeat)
+
+            tracemalloc.start()
+            func(*args[0])
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            result.append({
+                'name': name,
+                'case': case,
+                'n': sum(np.size(a[0]) for a in args),
+                'msec': sec * 1e3,
+                'peak_kb': peak / 1024,
+                'err_max': max(int(np.abs(r.astype(np.int32) - d).max())
+                               for r, d in zip(ref, data))
+            })
+
+    return result
+
+
+def bench_play(midi_files, repeat=1):
+    """
+    playback simulation: ``Player`` on ``VirtualClock``
+
+    Each file is played by ``Player`` with ``RecordingBackend`` on
+    ``VirtualClock`` (no wait, no sound), and the wall time is compared
+    with the length of the song.
+
+    Parameters
+    ----------
+    midi_files: list of str
+    repeat: int
+
+    Returns
+    -------
+    result: list of dict
+        [{'name': str, 'notes': int, 'song_sec': float,
+          'wall_sec': float, 'speed': float}, ..]
+        speed: song_sec / wall_sec
+    """
+    parser = Parser(reader=Parser.READER_NATIVE)
+
+    result = []
+    for midi_file in midi_files:
+        parsed = parser.parse(midi_file, note_table=True)
+
+        def play(parsed=parsed):
+            clock = VirtualClock()
+            backend = RecordingBackend(clock=clock)
+            player = Player(backend=backend, clock=clock)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                player.play(parsed)
+
+            return (len(backend.records), clock.now())
+
+        sec, (notes, song_sec) = measure(play, repeat)
+
+        result.append({
+            'name': midi_file,
+            'notes': notes,
+            'song_sec': song_sec,
+            'wall_sec': sec,
+            'speed': song_sec / sec if sec > 0 else 0.0
+        })
+
+    return result
+
+
+def bench_interval(midi_files, repeat=3, n_query=1000, min_notes=1000000):
+    """
+    "sounding at t" queries: linear scan vs ``IntervalIndex``
+
+    All notes of the files are concatenated (shifted in time) into
+    one long ``NoteTable``, repeatedly until it has ``min_notes`` notes,
+    and ``n_query`` random times are queried.
+
+    Parameters
+    ----------
+    midi_files: list of str
+    repeat: int
+    n_query: int
+    min_notes: int
+
+    Returns
+    -------
+    result: list of dict
+        [{'name': str, 'notes': int, 'usec': float}, ..]
+        usec: per query
+    """
+    parser = Parser(reader=Parser.READER_NATIVE)
+
+    tables = []
+    for midi_file in midi_files:
+        table = parser.parse(midi_file, note_table=True)['note_info']
+        if len(table) > 0:
+            tables.append(table)
+
+    if not tables:
+        return []
+
+    cols = {'abs_time': [], 'end_time': []}
+    offset = 0.0
+    n_notes = 0
+    while n_notes < min_notes:
+        for table in tables:
+            cols['abs_time'].append(table.abs_time + offset)
+            cols['end_time'].append(table.end_time + offset)
+            offset += float(np.nanmax(table.end_time))
+            n_notes += len(table)
+
+    table = NoteTable(np.concatenate(cols['abs_time']),
+                      np.concatenate(cols['end_time']),
+                      np.zeros(n_notes), np.zeros(n_notes),
+                      np.zeros(n_notes))
+
+    query = np.random.default_rng(0).uniform(0, offset, n_query).tolist()
+
+    def scan():
+        return [np.flatnonzero((table.abs_time <= t)
+                               & (table.end_time > t)) for t in query]
+
+    def index():
+        idx = table.interval_index()
+        return [idx.at(t) for t in query]
+
+    result = []
+    for name, func in (('scan', scan), ('index', index)):
+        sec, _ = measure(func, repeat)
+
+        result.append({
+            'name': name,
+            'notes': len(table),
+            'usec': sec / n_query * 1e6
+        })
+
+    return result
+
+
+def bench_logging(midi_files, repeat=3, n_logger=1000):
+    """
+    logging overhead: ``get_logger()``, and per-note in parse/play
+
+    Parameters
+    ----------
+    midi_files: list of str
+    repeat: int
+    n_logger: int
+        number of ``get_logger()`` calls
+
+    Returns
+    -------
+    result: list of dict
+        get_logger: [{'name': str, 'usec': float}, ..]
+            per call (``legacy_get_logger()`` vs ``get_logger()``)
+        parse, play: [{'name': str, 'notes': int, 'usec': float,
+                       'log_calls': float, 'log_usec': float}, ..]
+            per note: time, logger calls and time of logger calls
+            (the difference from ``logging.disable()``)
+    """
+    result = []
+
+    for name, func in (('legacy_get_logger', legacy_get_logger),
+                       ('get_logger', get_logger)):
+        sec, _ = measure(
+            lambda f=func: [f('BenchLogger') for _ in range(n_logger)],
+            repeat)
+
+        result.append({'name': name, 'usec': sec / n_logger * 1e6})
+
+    parser = Parser(reader=Parser.READER_NATIVE)
+
+    def parse():
+        return sum(len(parser.parse(f, note_table=True)['note_info'])
+                   for f in midi_files)
+
+    parsed = [parser.parse(f, note_table=True) for f in midi_files]
+
+    def play():
+        n_notes = 0
+        for data in parsed:
+            clock = VirtualClock()
+            backend = RecordingBackend(clock=clock)
+            Player(backend=backend, clock=clock).play(data)
+            n_notes += len(backend.records)
+
+        return n_notes
+
+    for name, func in (('parse', parse), ('play', play)):
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            func()  # warm up (sample bank etc.)
+
+            with LogCounter() as counter:
+                sec, n_notes = measure(func, 1)
+
+            sec, n_notes = measure(func, repeat)
+
+            logging.disable(logging.CRITICAL)
+            try:
+                sec_off, _ = measure(func, repeat)
+            finally:
+                logging.disable(logging.NOTSET)
+
+        n_notes = max(n_notes, 1)
+        result.append({
+            'name': name,
+            'notes': n_notes,
+            'usec': sec / n_notes * 1e6,
+            'log_calls': counter.count / n_notes,
+            'log_usec': (sec - sec_off) / n_notes * 1e6
+        })
+
+    return result
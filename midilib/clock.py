@@ -0,0 +1,125 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Clocks for Player
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import time
+
+
+class Clock:
+    """
+    Real clock: ``time.perf_counter()`` and ``time.sleep()``
+
+    ``Player`` は、時刻の取得と待ち合わせを clock に任せる。
+    ``VirtualClock`` に差し替えると、待たずに時刻を進めるので、
+    実時間よりはるかに速く再生処理をシミュレーションできる。
+    """
+    def now(self):
+        """
+        Returns
+        -------
+        now: float
+            [sec] (monotonic)
+        """
+        return time.perf_counter()
+
+    def sleep_until(self, deadline, spin_sec=0.0, event=None):
+        """
+        Parameters
+        ----------
+        deadline: float
+            ``now()`` value
+        spin_sec: float
+            spin-wait for the last ``spin_sec`` (0: no spin-wait)
+        event: threading.Event or None
+            wake up when the event is set
+
+        Returns
+        -------
+        interrupted: bool
+            woken up by ``event`` before the deadline
+        """
+        remain = deadline - time.perf_counter()
+
+        if spin_sec <= 0:
+            if remain > 0:
+                return self._wait(remain, event)
+            return False
+
+        if remain > spin_sec:
+            if self._wait(remain - spin_sec, event):
+                return True
+
+        while time.perf_counter() < deadline:
+            pass
+
+        return False
+
+    @staticmethod
+    def _wait(sec, event):
+        """
+        Returns
+        -------
+        interrupted: bool
+        """
+        if event is None:
+            time.sleep(sec)
+            return False
+
+        return event.wait(sec)
+
+    def sleep(self, sec):
+        """
+        Parameters
+        ----------
+        sec: float
+        """
+        self.sleep_until(self.now() + sec)
+
+
+class VirtualClock(Clock):
+    """
+    Virtual clock
+
+    ``sleep_until()`` は、待たずに時刻を deadline まで進める。
+
+    Simple Usage
+    ------------
+    ============================================================
+    clock = VirtualClock()
+    backend = RecordingBackend(clock=clock)
+
+    Player(backend=backend, clock=clock).play(parsed_data)
+    ============================================================
+    """
+    def __init__(self, start=0.0):
+        """ Constructor
+
+        Parameters
+        ----------
+        start: float
+            initial time [sec]
+        """
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def sleep_until(self, deadline, spin_sec=0.0, event=None):
+        if event is not None and event.is_set():
+            return True
+
+        self._now = max(self._now, deadline)
+        return False
+
+    def advance(self, sec):
+        """
+        Parameters
+        ----------
+        sec: float
+        """
+        self._now += sec
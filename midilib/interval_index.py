@@ -0,0 +1,212 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Interval index of notes
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import numpy as np
+
+
+class IntervalIndex:
+    """
+    Interval index of notes
+
+    各 note を区間 [abs_time, end_time) とみなし、
+    「時刻 t に鳴っている note」や「区間 [t0, t1) に重なる note」を、
+    全 note を走査せずに二分探索で求める。
+
+    note を長さで(``LEN_RATIO`` 倍毎の)クラスに分け、
+    クラス毎に開始時刻順に並べる。
+    長さが len_min .. len_max のクラスでは、時刻 t に重なる候補は
+    開始時刻が (t - len_max, t] のものなので、二分探索で決まる。
+    候補のうち、重ならないものは、時刻 t - len_min に鳴っているので、
+    余分に調べる数は同時に鳴っている音の数程度で済む
+    (長い音があっても、他のクラスの探索範囲は広がらない)。
+    end_time が無い(None/NaN)の note は、最後まで鳴っているとみなす。
+
+    返す index は、元の配列(NoteTable)の index。
+
+    Simple Usage
+    ------------
+    ============================================================
+    table = Parser().parse(midi_file, note_table=True)['note_info']
+    index = table.interval_index()
+
+    table[index.at(10.0)]          # sounding at 10.0 sec
+    table[index.overlap(5.0, 6.0)]  # overlapping [5.0, 6.0)
+    table[index.seek(10.0)]         # starting at/after 10.0 sec
+    ============================================================
+    """
+    LEN_UNIT = 1 / 64  # sec .. max length of the shortest class
+    LEN_RATIO = 4      # ratio of max/min length in a class
+
+    def __init__(self, abs_time, end_time):
+        """ Constructor
+
+        Parameters
+        ----------
+        abs_time, end_time: array like of float
+            start/end time of notes [sec]
+        """
+        abs_time = np.asarray(abs_time, dtype=np.float64)
+        end_time = np.asarray(end_time, dtype=np.float64)
+        end_time = np.where(np.isnan(end_time), np.inf, end_time)
+
+        self._order = np.argsort(abs_time, kind='stable')
+        self._start = abs_time[self._order]
+        self._end_sorted = np.sort(end_time)
+
+        end = end_time[self._order]
+        length = end - self._start
+
+        # class of length: 0 (<= LEN_UNIT), 1, 2, .. and last (inf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            len_cls = np.ceil(np.log(np.maximum(length, self.LEN_UNIT)
+                                     / self.LEN_UNIT)
+                              / np.log(self.LEN_RATIO))
+        len_cls[np.isinf(length)] = np.inf
+
+        # all classes in one array, sorted by (class, rank)
+        # rank: position in start time order
+        # key: class * (n + 1) + rank (exact in int64)
+        n_notes = self._start.size
+        cls_values, cls = np.unique(len_cls, return_inverse=True)
+        cls = cls.reshape(-1)
+
+        self._rank = np.lexsort((np.arange(n_notes), cls))
+        self._end = end[self._rank]
+        self._key = cls[self._rank].astype(np.int64) * (n_notes + 1) \
+            + self._rank
+
+        # key of range: [lo of class 0, 1, .., hi of class 0, 1, ..]
+        #   = _cls_base + rank[_rank_take]
+        #   rank: [rank_lo of class 0, 1, .., rank_hi]
+        self._n_cls = cls_values.size
+        self._cls_base = np.tile(
+            np.arange(self._n_cls, dtype=np.int64) * (n_notes + 1), 2)
+        self._rank_take = np.append(np.arange(self._n_cls),
+                                    np.full(self._n_cls, self._n_cls))
+
+        len_max = np.zeros(self._n_cls)
+        np.maximum.at(len_max, cls, length)
+        # margin for rounding of ``end - start``
+        self._len_max = len_max + np.abs(len_max) * 1e-9 + 1e-9
+
+    @classmethod
+    def from_note_table(cls, table):
+        """
+        Parameters
+        ----------
+        table: NoteTable
+
+        Returns
+        -------
+        index: IntervalIndex
+        """
+        return cls(table.abs_time, table.end_time)
+
+    def _query(self, t0, t1):
+        """
+        Parameters
+        ----------
+        t0, t1: float
+            start < t1 and end > t0
+
+        Returns
+        -------
+        idx: np.ndarray of int64
+            notes with end > t0 (in start time order)
+        """
+        # range of rank in each class: start >= t0 - len_max, start < t1
+        rank = self._start.searchsorted(np.append(t0 - self._len_max, t1))
+
+        pos = self._key.searchsorted(self._cls_base + rank[self._rank_take])
+        lo = pos[:self._n_cls]
+        n_cand = np.maximum(pos[self._n_cls:] - lo, 0)
+
+        total = int(n_cand.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # positions of all candidates
+        idx = np.repeat(lo - np.cumsum(n_cand) + n_cand, n_cand) \
+            + np.arange(total)
+
+        rank = self._rank[idx[self._end[idx] > t0]]
+        rank.sort()
+        return self._order[rank]
+
+    def overlap(self, t0, t1):
+        """
+        notes overlapping [t0, t1)
+
+        Parameters
+        ----------
+        t0, t1: float
+            [sec]
+
+        Returns
+        -------
+        idx: np.ndarray of int64
+            in start time order
+        """
+        return self._query(t0, t1)
+
+    def at(self, t):
+        """
+        notes sounding at t (abs_time <= t < end_time)
+
+        Parameters
+        ----------
+        t: float
+            [sec]
+
+        Returns
+        -------
+        idx: np.ndarray of int64
+            in start time order
+        """
+        # start <= t .. start < next float of t
+        return self._query(t, np.nextafter(t, np.inf))
+
+    def count_at(self, t):
+        """
+        number of notes sounding at t
+
+        Parameters
+        ----------
+        t: float
+            [sec]
+
+        Returns
+        -------
+        n: int
+        """
+        n_started = np.searchsorted(self._start, t, side='right')
+        n_ended = np.searchsorted(self._end_sorted, t, side='right')
+
+        return int(n_started - n_ended)
+
+    def seek(self, t):
+        """
+        notes starting at/after t
+
+        Parameters
+        ----------
+        t: float
+            [sec]
+
+        Returns
+        -------
+        idx: np.ndarray of int64
+            in start time order
+        """
+        lo = int(np.searchsorted(self._start, t, side='left'))
+
+        return self._order[lo:]
+
+    def __len__(self):
+        return self._start.size
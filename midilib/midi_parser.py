@@ -8,92 +8,243 @@ MIDI parser
 __author__ = 'Yoichi Tanibayashi'
 __date__ = '2021/01'
 
-import copy
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import mido  # pylint: disable=import-error
+from .note_info import NoteInfo
+from .note_table import NoteTable, as_note_table
+from .note_pairing import NotePairing
+from .smf_reader import SmfReader
+from .tempo_map import TempoMap
+from .piano_roll import PianoRoll
+from .visual_writer import VisualWriter
+from .parse_cache import ParseCache
 from .my_logger import get_logger
 
 
-class NoteInfo:
+class Parser:
     """
-    parsed MIDI data entity
-
-    Attributes
-    ----------
-    abs_time: float
-        sec >= 0
-    channel: int
-        0 .. 15
-    note: int
-        0 .. 127
-    velocity: int
-        0 .. 127
-    end_time: float
-        sec >= abs_time >= 0
+    MIDI parser
     """
+    MIDI_NOTE_N = 128
+
+    V_CHR_ON = PianoRoll.CHR_ON
+    V_CHR_OFF = PianoRoll.CHR_OFF
+
+    V_CHR_START = PianoRoll.CHR_START
+    V_CHR_STOP = PianoRoll.CHR_STOP
+
+    EVENT_DTYPE = np.dtype([('abs_time', np.float64),
+                            ('group', np.int64),
+                            ('channel', np.uint8),
+                            ('note', np.uint8),
+                            ('velocity', np.uint8)])
+
+    READER_MIDO = 'mido'
+    READER_NATIVE = 'native'
+    READERS = (READER_MIDO, READER_NATIVE)
+
     def __init__(self,  # pylint: disable=too-many-arguments
-                 abs_time=None, channel=None, note=None,
-                 velocity=None, end_time=None, debug=False):
+                 debug=False, *,
+                 overlap=NotePairing.FIFO, reader=READER_MIDO,
+                 cache_dir=None, cache_size=ParseCache.DEF_SIZE_MAX):
+        """ Constructor
+
+        Parameters
+        ----------
+        overlap: str
+            overlap policy of note on/off pairing
+            'fifo', 'lifo' or 'retrigger' (see ``NotePairing``)
+        reader: str
+            MIDI file reader
+            'mido': ``mido.MidiFile``
+            'native': built-in fast reader (see ``SmfReader``)
+        cache_dir: str or None
+            directory of parse cache (None: no cache)
+            see ``ParseCache``
+        cache_size: int
+            max total size of parse cache [bytes]
+        """
         self._dbg = debug
         self._log = get_logger(__class__.__name__, self._dbg)
 
-        self.abs_time = round(abs_time, 3)
-        self.channel = channel
-        self.note = note
-        self.velocity = velocity
-        self.end_time = None
-        if isinstance(end_time, float):
-            self.end_time = round(end_time, 3)
+        if overlap not in NotePairing.POLICIES:
+            raise ValueError('invalid `overlap` value: %s' % (overlap))
+
+        if reader not in self.READERS:
+            raise ValueError('invalid `reader` value: %s' % (reader))
 
-    def __str__(self):
+        self._overlap = overlap
+        self._reader = reader
+
+        self._cache_dir = cache_dir
+        self._cache_size = cache_size
+
+        self._cache = None
+        if cache_dir:
+            self._cache = ParseCache(cache_dir, cache_size,
+                                     debug=self._dbg)
+
+        self._channel_set = None
+        self._tempo_map = None
+        self.unmatched = {'note_on': 0, 'note_off': 0}
+
+    @staticmethod
+    def mido_events(midi_obj):
         """
+        generate events of MIDI file obj in the same form as
+        ``SmfReader.events()``
+
+        Parameters
+        ----------
+        midi_obj:
+            MIDI file obj
+
         Returns
         -------
-        str_data: str
-
+        generator of (tick, ev_type, channel, note, value)
         """
-        str_data = 'start:%08.3f channel:%02d note:%03d velocity:%03d' % (
-            self.abs_time, self.channel, self.note, self.velocity)
+        tick = 0
 
-        if self.end_time and isinstance(self.end_time, float):
-            str_data += ' end:%08.3f length:%05.2f' % (
-                self.end_time, self.length())
+        for msg in mido.merge_tracks(midi_obj.tracks):
+            tick += msg.time
 
-        return str_data
+            if msg.type == 'set_tempo':
+                yield (tick, SmfReader.SET_TEMPO, None, None, msg.tempo)
 
-    def length(self):
+            elif msg.type == 'end_of_track':
+                yield (tick, SmfReader.END_OF_TRACK, None, None, None)
+
+            elif msg.type in ('note_on', 'note_off'):
+                yield (tick, msg.type, msg.channel, msg.note, msg.velocity)
+
+    def collect_events(self, ticks_per_beat, events, channel=None):
         """
+        collect note events as columns
+
+        Parameters
+        ----------
+        ticks_per_beat: int
+        events: iterable of (tick, ev_type, channel, note, value)
+            see ``SmfReader.events()``
+        channel: list of int
+            selected channel
+
         Returns
         -------
-        length: float
-            length of note [msec]
+        (channel_set, columns): (set of int, dict)
+            columns: {'abs_time': list of float,
+                      'channel': list of int,
+                      'note': list of int,
+                      'velocity': list of int}
+            velocity == 0 means note off
         """
-        return self.end_time - self.abs_time
+        tempo_map = TempoMap(ticks_per_beat)
 
+        channel_set = set()
+        col_tick = []
+        col_channel = []
+        col_note = []
+        col_velocity = []
+
+        for tick, ev_type, ch, note, value in events:
+            if ev_type == SmfReader.SET_TEMPO:
+                tempo_map.append(tick, value)
+                continue
 
-class Parser:
-    """
-    MIDI parser
-    """
-    MIDI_NOTE_N = 128
+            if ev_type == SmfReader.END_OF_TRACK:
+                break
 
-    V_CHR_ON = '|'
-    V_CHR_OFF = ' '
+            channel_set.add(ch)
+            if channel and ch not in channel:
+                continue
 
-    V_CHR_START = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    V_CHR_STOP = 'abcdefghijklmnopqrstuvwxyz'
+            velocity = 0
+            if ev_type == SmfReader.NOTE_ON:
+                velocity = value
 
-    def __init__(self, debug=False):
-        """ Constructor
+            col_tick.append(tick)
+            col_channel.append(ch)
+            col_note.append(note)
+            col_velocity.append(velocity)
+
+        return (channel_set,
+                self.mk_columns(tempo_map, col_tick, col_channel,
+                                col_note, col_velocity))
+
+    def read_events(self, midi_obj, channel=None):
+        """
+        read note events from MIDI file obj as columns
+
+        Parameters
+        ----------
+        midi_obj:
+            MIDI file obj
+        channel: list of int
+            selected channel
+
+        Returns
+        -------
+        (channel_set, columns): (set of int, dict)
+            see ``collect_events()``
+        """
+        return self.collect_events(midi_obj.ticks_per_beat,
+                                   self.mido_events(midi_obj), channel)
+
+    def read_smf_events(self, midi_file, channel=None):
+        """
+        read note events from MIDI file by ``SmfReader``
 
         Parameters
         ----------
         midi_file: str
-            file name of MIDI file
+            MIDI file name
+        channel: list of int
+            selected channel
+
+        Returns
+        -------
+        (channel_set, columns): (set of int, dict)
+            see ``collect_events()``
         """
-        self._dbg = debug
-        self._log = get_logger(__class__.__name__, self._dbg)
+        with SmfReader(midi_file, debug=self._dbg) as reader:
+            channel_set, col = self.collect_events(reader.ticks_per_beat,
+                                                   reader.events(channel),
+                                                   channel)
+            return (channel_set | reader.channel_set(), col)
+
+    def mk_columns(self,  # pylint: disable=too-many-arguments
+                   tempo_map, tick, channel, note, velocity):
+        """
+        convert tick to sec, and make columns
 
-        self._channel_set = None
+        Parameters
+        ----------
+        tempo_map: TempoMap
+        tick, channel, note, velocity: list of int
+
+        Returns
+        -------
+        columns: dict
+            see ``collect_events()``
+        """
+        self._tempo_map = tempo_map
+        if self._dbg:
+            self._log.debug('tempo_map=%s', tempo_map)
+
+        abs_time = np.round(tempo_map.tick2sec(
+            np.array(tick, dtype=np.int64)), 3)
+
+        columns = {
+            'abs_time': abs_time.tolist(),
+            'channel': channel,
+            'note': note,
+            'velocity': velocity
+        }
+        return columns
 
     def parse1(self, midi_obj, channel=None):
         """
@@ -111,111 +262,225 @@ class Parser:
         data: list of NoteInfo
 
         """
-        # self._log.debug('midi_obj=%s', midi_obj.__dict__)
-        # self._log.debug('channel=%s', channel)
+        channel_set, col = self.read_events(midi_obj, channel)
 
-        merged_tracks = mido.merge_tracks(midi_obj.tracks)
+        out_data = [
+            NoteInfo(abs_time, ch, note, velocity)
+            for abs_time, ch, note, velocity in zip(
+                col['abs_time'], col['channel'],
+                col['note'], col['velocity'])
+        ]
 
-        tpb = midi_obj.ticks_per_beat
+        return (channel_set, out_data)
 
-        channel_set = set()
-        out_data = []
-        abs_time = 0
-        cur_tempo = None
+    def pair_end_time(self,  # pylint: disable=too-many-arguments
+                      abs_time, channel, note, velocity, overlap=None):
+        """
+        pair note on/off events and calculate end time (single pass)
 
-        for msg in merged_tracks:
-            delta_sec = 0
-            try:
-                if cur_tempo:
-                    delta_sec = mido.tick2second(msg.time, tpb, cur_tempo)
-            except KeyError:
-                pass
+        The number of unmatched note on/off events is set to
+        ``self.unmatched``.
 
-            abs_time += delta_sec
+        Parameters
+        ----------
+        abs_time: list of float
+        channel: list of int
+        note: list of int
+        velocity: list of int
+        overlap: str or None
+            overlap policy (None: the policy given to constructor)
+
+        Returns
+        -------
+        end_time: list of float
+            end time of each event
+            (note off event: its own abs_time)
+        """
+        if overlap is None:
+            overlap = self._overlap
+
+        end_time = list(abs_time)
+        pairing = NotePairing(overlap)
+
+        for i, key in enumerate(zip(channel, note)):
+            if velocity[i] > 0:
+                cut_idx = pairing.note_on(key, i)
+                if cut_idx is not None:
+                    end_time[cut_idx] = abs_time[i]
 
-            if msg.type == 'set_tempo':
-                cur_tempo = msg.tempo
                 continue
 
-            if msg.type == 'end_of_track':
-                self._log.debug(msg.__dict__)
-                break
+            # velocity == 0
 
-            if msg.type == 'note_off':
-                channel_set.add(msg.channel)
-                if channel and msg.channel not in channel:
-                    continue
+            idx2 = pairing.note_off(key)
+            if idx2 is None:
+                if self._dbg:
+                    self._log.debug('unmatched note off: %s .. ignored',
+                                    key)
+                continue
 
-                data_ent = NoteInfo(abs_time, msg.channel, msg.note, 0,
-                                    debug=self._dbg)
+            end_time[idx2] = abs_time[i]
 
-                out_data.append(data_ent)
+        for idx in pairing.flush():
+            end_time[idx] = abs_time[-1]
 
-            if msg.type == 'note_on':
-                channel_set.add(msg.channel)
-                if channel and msg.channel not in channel:
-                    continue
+        self.unmatched = {'note_on': pairing.unmatched_on,
+                          'note_off': pairing.unmatched_off}
 
-                data_ent = NoteInfo(abs_time, msg.channel, msg.note,
-                                    msg.velocity, debug=self._dbg)
-                out_data.append(data_ent)
+        if pairing.unmatched_off > 0:
+            self._log.warning('unmatched=%s', self.unmatched)
+        else:
+            self._log.debug('unmatched=%s', self.unmatched)
 
-        return (channel_set, out_data)
+        return end_time
 
     def set_end_time(self, in_data):
         """
         set end time of NoteInfo
+
+        ``in_data`` is updated in place (not copied).
+
+        Parameters
+        ----------
+        in_data: list of NoteInfo
+
+        Returns
+        -------
+        in_data: list of NoteInfo
         """
         self._log.debug('')
 
-        out_data = copy.deepcopy(in_data)
-        note_start = {}
+        end_time = self.pair_end_time([d.abs_time for d in in_data],
+                                      [d.channel for d in in_data],
+                                      [d.note for d in in_data],
+                                      [d.velocity for d in in_data])
 
-        ent = None
-        for i, ent in enumerate(out_data):
-            key = (ent.channel, ent.note)
+        for d, e_time in zip(in_data, end_time):
+            d.end_time = e_time
 
-            if ent.velocity > 0:
-                if key in note_start.keys():
-                    note_start[key].append(i)
-                else:
-                    note_start[key] = [i]
+        return in_data
 
-                # self._log.debug('note_start=%s', note_start)
-                continue
+    def parse(self, midi_file, channel=None, note_table=False):
+        """
+        parse MIDI data
 
-            # velocity == 0
+        If ``cache_dir`` is given to the constructor, the result of
+        all channels is loaded from (or saved to) the parse cache,
+        and ``channel`` selects notes from it (``select_channels()``).
+        Otherwise, notes of the other channels are skipped
+        while reading the file.
 
-            ent.end_time = ent.abs_time
+        Parameters
+        ----------
+        midi_file: str
+            MIDI file name
+        channel: list of int or None for all channels
+            MIDI channel
+        note_table: bool
+            if True, 'note_info' is returned as ``NoteTable``
+            (columnar NumPy arrays) instead of list of NoteInfo
 
-            try:
-                idx2 = note_start[key].pop(0)
-            except KeyError as ex:
-                msg = '%s:%s .. ignored' % (type(ex).__name__, ex)
-                self._log.warning(msg)
-                continue
+        Returns
+        -------
+        out_data: {
+            'channel_set': set of int,
+            'note_info': list of NoteInfo or NoteTable,
+            'unmatched': {'note_on': int, 'note_off': int},
+            'tempo_map': TempoMap
+        }
+
+        """
+        self._log.debug('midi_file=%s, channel=%s', midi_file, channel)
+
+        if channel:
+            channel = sorted(set(channel))
+        else:
+            channel = None
 
-            # self._log.debug('%s, %s, %s', key, note_start[key], idx2)
+        cache_key = None
+        out_data = None
 
-            out_data[idx2].end_time = ent.abs_time
+        if self._cache:
+            cache_key = self._cache.mk_key(midi_file, {
+                'channel': None, 'overlap': self._overlap})
+            out_data = self._cache.load(cache_key)
+            self._log.debug('cache_key=%s, hit=%s',
+                            cache_key, out_data is not None)
 
-            if not note_start[key]:
-                note_start.pop(key)
+            if out_data is None:
+                out_data = self.parse_table(midi_file)
+                self._cache.save(cache_key, out_data)
 
-            # self._log.debug('note_start=%s', note_start)
+            if channel:
+                out_data = self.select_channels(out_data, channel)
 
-        for k in note_start:
-            for idx in note_start[k]:
-                if ent:
-                    out_data[idx].end_time = ent.abs_time
+        else:
+            out_data = self.parse_table(midi_file, channel)
 
-        # self._log.debug('note_start=%s', note_start)
+        self._channel_set = out_data['channel_set']
+        self._tempo_map = out_data['tempo_map']
+        self.unmatched = out_data['unmatched']
+
+        if not note_table:
+            out_data['note_info'] = out_data['note_info'].to_note_info()
 
         return out_data
 
-    def parse(self, midi_file, channel=None):
+    @staticmethod
+    def select_channels(parsed_data, channel):
         """
-        parse MIDI data
+        select notes of the channels from parsed data
+        (without parsing again)
+
+        Parameters
+        ----------
+        parsed_data: dict
+            see ``parse()``
+        channel: list of int
+            selected channel
+
+        Returns
+        -------
+        out_data: dict
+            same as ``parsed_data``, except 'note_info'
+            ('channel_set' and 'unmatched' are of all channels)
+        """
+        note_info = parsed_data['note_info']
+
+        if isinstance(note_info, NoteTable):
+            note_info = note_info.select_channels(channel)
+        else:
+            note_info = [d for d in note_info if d.channel in channel]
+
+        return dict(parsed_data, note_info=note_info)
+
+    def parse_channels(self, midi_file):
+        """
+        parse MIDI data once, and split notes by channel
+
+        Parameters
+        ----------
+        midi_file: str
+            MIDI file name
+
+        Returns
+        -------
+        out_data: dict
+            result of ``parse(midi_file, note_table=True)`` and
+            'channels': {int: NoteTable}
+                {channel: notes of the channel}
+                (see ``NoteTable.split_channels()``)
+        """
+        out_data = self.parse(midi_file, note_table=True)
+        out_data['channels'] = out_data['note_info'].split_channels()
+
+        return out_data
+
+    def parse_one(self, midi_file, channel=None):
+        """
+        parse MIDI data for ``parse_many()``
+
+        Exceptions are not raised, but returned as 'error'.
 
         Parameters
         ----------
@@ -226,176 +491,466 @@ class Parser:
 
         Returns
         -------
-        out_data: {
+        result: {
+            'midi_file': str,
             'channel_set': set of int,
-            'note_info': list of NoteInfo
+            'note_info': NoteTable or None,
+            'unmatched': {'note_on': int, 'note_off': int},
+            'tempo_map': TempoMap,
+            'sec': float,
+            'error': str or None
         }
+            picklable (no NoteInfo)
+        """
+        start = time.perf_counter()
+
+        try:
+            result = self.parse(midi_file, channel, note_table=True)
+            result['error'] = None
+
+        except Exception as ex:  # pylint: disable=broad-except
+            result = {
+                'channel_set': set(),
+                'note_info': None,
+                'unmatched': None,
+                'tempo_map': None,
+                'error': '%s: %s' % (type(ex).__name__, ex)
+            }
+
+        result['midi_file'] = midi_file
+        result['sec'] = time.perf_counter() - start
+
+        return result
 
+    def parse_many(self, midi_files, channel=None, workers=None,
+                   callback=None):
         """
-        self._log.debug('midi_file=%s, channel=%s', midi_file, channel)
+        parse many MIDI files on a process pool
 
-        midi_obj = mido.MidiFile(midi_file)
+        An error of a file does not abort the batch.
 
-        self._channel_set, data1 = self.parse1(midi_obj, channel)
+        Parameters
+        ----------
+        midi_files: list of str
+            MIDI file names
+        channel: list of int or None for all channels
+            MIDI channel
+        workers: int or None
+            number of worker processes (None: number of CPUs)
+            1: parse in this process
+        callback: function or None
+            called with each result, in the order of ``midi_files``
+
+        Returns
+        -------
+        results: list of dict
+            in the order of ``midi_files``, see ``parse_one()``
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        self._log.debug('len(midi_files)=%s, workers=%s',
+                        len(midi_files), workers)
+
+        if workers <= 1:
+            results = []
+            for midi_file in midi_files:
+                results.append(self.parse_one(midi_file, channel))
+                if callback:
+                    callback(results[-1])
+
+            return results
+
+        parser_args = {
+            'overlap': self._overlap,
+            'reader': self._reader,
+            'cache_dir': self._cache_dir,
+            'cache_size': self._cache_size,
+        }
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_parse_worker, parser_args, midi_file,
+                                channel)
+                for midi_file in midi_files
+            ]
+
+            results = []
+            for midi_file, future in zip(midi_files, futures):
+                try:
+                    result = future.result()
+                except Exception as ex:  # pylint: disable=broad-except
+                    result = {
+                        'midi_file': midi_file,
+                        'channel_set': set(),
+                        'note_info': None,
+                        'unmatched': None,
+                        'tempo_map': None,
+                        'sec': 0.0,
+                        'error': '%s: %s' % (type(ex).__name__, ex)
+                    }
+
+                results.append(result)
+                if callback:
+                    callback(result)
+
+        return results
+
+    def parse_table(self, midi_file, channel=None):
+        """
+        parse MIDI data as NoteTable (without cache)
+
+        Parameters
+        ----------
+        midi_file: str
+            MIDI file name
+        channel: list of int or None for all channels
+            MIDI channel
+
+        Returns
+        -------
+        out_data: dict
+            see ``parse()``
+        """
+        if self._reader == self.READER_NATIVE:
+            self._channel_set, col = self.read_smf_events(midi_file,
+                                                          channel)
+        else:
+            midi_obj = mido.MidiFile(midi_file)
+            self._channel_set, col = self.read_events(midi_obj, channel)
 
         self._log.debug('channel_set=%s', self._channel_set)
 
-        data2 = self.set_end_time(data1)
+        end_time = self.pair_end_time(col['abs_time'], col['channel'],
+                                      col['note'], col['velocity'])
 
         # remove velocity == 0
-        data3 = []
-        for d in data2:
-            if d.velocity > 0:
-                data3.append(d)
+        velocity = np.array(col['velocity'], dtype=np.uint8)
+        on_idx = np.flatnonzero(velocity)
+
+        table = NoteTable(
+            np.array(col['abs_time'], dtype=np.float64)[on_idx],
+            np.array(end_time, dtype=np.float64)[on_idx],
+            np.array(col['channel'], dtype=np.uint8)[on_idx],
+            np.array(col['note'], dtype=np.uint8)[on_idx],
+            velocity[on_idx])
 
         out_data = {
             'channel_set': self._channel_set,
-            'note_info': data3
+            'note_info': table,
+            'unmatched': self.unmatched,
+            'tempo_map': self._tempo_map
         }
         return out_data
 
-    def mk_event_list(self, data):
+    def iter_notes(self, ticks_per_beat, events, channel=None):
         """
+        generate NoteInfo from events
+
+        Only notes waiting for note off (and the notes started after
+        them) are kept in memory.
+
         Parameters
         ----------
-        data: list of NoteInfo
+        ticks_per_beat: int
+        events: iterable of (tick, ev_type, channel, note, value)
+            see ``SmfReader.events()``
+        channel: list of int
+            selected channel
 
         Returns
         -------
-        sorted_ev: list of NoteEvent
+        generator of NoteInfo
+            in start time order
         """
-        ev = []
+        self._channel_set = set()
+        self._tempo_map = TempoMap(ticks_per_beat)
+        pairing = NotePairing(self._overlap)
 
-        for i, ni in enumerate(data):
-            if ni.velocity == 0:
-                continue
+        # [abs_time, channel, note, velocity, end_time] in start order
+        pending = deque()
+        abs_time = 0
 
-            ev.append({
-                'abs_time': ni.abs_time,
-                'event': [{'note': ni.note,
-                           'channel': ni.channel,
-                           'velocity': ni.velocity}]
-            })
-            ev.append({
-                'abs_time': ni.end_time,
-                'event': [{'note': ni.note,
-                           'channel': ni.channel,
-                           'velocity': 0}]
-            })
-
-        sorted_ev = sorted(ev, key=lambda x: x['abs_time'])
-
-        merged_ev = []
-        abs_time = -1
-        for ev in sorted_ev:
-            if ev['abs_time'] != abs_time:
-                merged_ev.append(ev)
-                abs_time = ev['abs_time']
+        for tick, ev_type, ch, note, value in events:
+            if ev_type == SmfReader.SET_TEMPO:
+                self._tempo_map.append(tick, value)
                 continue
 
-            merge_flag = False
-            for e1 in merged_ev[-1]['event']:
-                if e1['note'] == ev['event'][0]['note']:
-                    merge_flag = True
-                    break
+            if ev_type == SmfReader.END_OF_TRACK:
+                break
 
-            if merge_flag:
-                merged_ev.append(ev)
+            self._channel_set.add(ch)
+            if channel and ch not in channel:
                 continue
 
-            merged_ev[-1]['event'].append(ev['event'][0])
+            abs_time = float(np.round(self._tempo_map.tick2sec(tick), 3))
 
-        return merged_ev
+            if ev_type == SmfReader.NOTE_ON and value > 0:
+                ent = [abs_time, ch, note, value, None]
+                pending.append(ent)
 
-    def mk_visual(self, data):
+                cut_ent = pairing.note_on((ch, note), ent)
+                if cut_ent is not None:
+                    cut_ent[4] = abs_time
+
+            else:
+                ent = pairing.note_off((ch, note))
+                if ent is None:
+                    continue
+
+                ent[4] = abs_time
+
+            while pending and pending[0][4] is not None:
+                yield NoteInfo(*pending.popleft())
+
+        for ent in pairing.flush():
+            ent[4] = abs_time
+
+        self.unmatched = {'note_on': pairing.unmatched_on,
+                          'note_off': pairing.unmatched_off}
+        self._log.debug('unmatched=%s', self.unmatched)
+
+        while pending:
+            yield NoteInfo(*pending.popleft())
+
+    def parse_iter(self, midi_file, channel=None):
         """
+        parse MIDI data as a stream
+
+        Each NoteInfo is generated as soon as its end time is known,
+        without waiting for parsing of the whole file.
+        ``channel_set()``, ``tempo_map()`` and ``self.unmatched``
+        are complete after the generator is exhausted.
+
         Parameters
         ----------
-        data: list of NoteInfo
+        midi_file: str
+            MIDI file name
+        channel: list of int or None for all channels
+            MIDI channel
+
+        Returns
+        -------
+        generator of NoteInfo
+            in start time order
+        """
+        self._log.debug('midi_file=%s, channel=%s', midi_file, channel)
+
+        if self._reader == self.READER_NATIVE:
+            with SmfReader(midi_file, debug=self._dbg) as reader:
+                yield from self.iter_notes(reader.ticks_per_beat,
+                                           reader.events(channel), channel)
+                self._channel_set |= reader.channel_set()
+            return
+
+        midi_obj = mido.MidiFile(midi_file)
+        yield from self.iter_notes(midi_obj.ticks_per_beat,
+                                   self.mido_events(midi_obj), channel)
+
+    def channel_set(self):
+        """
+        Returns
+        -------
+        channel_set: set of int
+            channels of the last parsed file
+        """
+        return self._channel_set
+
+    def tempo_map(self):
+        """
+        Returns
+        -------
+        tempo_map: TempoMap
+            tempo map of the last parsed file
+        """
+        return self._tempo_map
+
+    def mk_event_array(self, data):
+        """
+        make sorted and grouped note on/off event array
+
+        Events are sorted by (abs_time, group, on/off, note) with
+        ``np.lexsort()``. Simultaneous events are grouped in one
+        pass: the n-th event of a note at the same time belongs to
+        the n-th group of the time, so that each note appears
+        at most once in a group. Note off comes before note on in
+        a group.
+        The note off of a zero-length note (end_time == abs_time)
+        comes after its own note on, in the next group.
+
+        Parameters
+        ----------
+        data: NoteTable or list of NoteInfo
+
+        Returns
+        -------
+        ev: np.ndarray of Parser.EVENT_DTYPE
+            velocity == 0 means note off
+        """
+        table = as_note_table(data)
+        table = table[table.velocity > 0]
+        n_notes = len(table)
+
+        abs_time = np.concatenate((table.abs_time, table.end_time))
+        note = np.concatenate((table.note, table.note))
+        channel = np.concatenate((table.channel, table.channel))
+        velocity = np.concatenate((table.velocity,
+                                   np.zeros(n_notes, dtype=np.uint8)))
+        is_on = velocity > 0
+
+        # order in the same (abs_time, note):
+        #   note off, then (note on, note off of the same note if
+        #   zero-length) of each note, in the order of the notes
+        is_zero = np.concatenate((np.zeros(n_notes, dtype=bool),
+                                  table.end_time == table.abs_time))
+        is_off_first = ~is_on & ~is_zero
+        src = np.tile(np.arange(n_notes), 2)
+
+        # rank of the event in the same (abs_time, note)
+        idx = np.lexsort((~is_on, src, ~is_off_first, note, abs_time))
+        s_time = abs_time[idx]
+        s_note = note[idx]
+
+        new_run = np.ones(idx.size, dtype=bool)
+        new_run[1:] = (s_time[1:] != s_time[:-1]) | (
+            s_note[1:] != s_note[:-1])
+        run_start = np.maximum.accumulate(
+            np.where(new_run, np.arange(idx.size), 0))
+
+        rank = np.empty(idx.size, dtype=np.int64)
+        rank[idx] = np.arange(idx.size) - run_start
+
+        # sort by (abs_time, rank, on/off, note)
+        idx = np.lexsort((note, is_on, rank, abs_time))
+        s_time = abs_time[idx]
+        s_rank = rank[idx]
+
+        new_group = np.ones(idx.size, dtype=bool)
+        new_group[1:] = (s_time[1:] != s_time[:-1]) | (
+            s_rank[1:] != s_rank[:-1])
+
+        ev = np.empty(idx.size, dtype=self.EVENT_DTYPE)
+        ev['abs_time'] = s_time
+        ev['group'] = np.cumsum(new_group) - 1
+        ev['channel'] = channel[idx]
+        ev['note'] = note[idx]
+        ev['velocity'] = velocity[idx]
+
+        return ev
+
+    @staticmethod
+    def event_array_to_list(ev):
         """
-        ev = self.mk_event_list(data)
+        dict view of event array
 
-        note_min = self.MIDI_NOTE_N - 1
-        note_max = 0
+        Parameters
+        ----------
+        ev: np.ndarray of Parser.EVENT_DTYPE
 
-        v_data = []
-        prev_chr_list = [self.V_CHR_OFF] * self.MIDI_NOTE_N
-        on_count = [0] * self.MIDI_NOTE_N
+        Returns
+        -------
+        ev_list: list of NoteEvent
+            [{'abs_time': float,
+              'event': [{'note': int, 'channel': int, 'velocity': int},
+                        ..]},
+             ..]
+        """
+        abs_time = ev['abs_time'].tolist()
+        note = ev['note'].tolist()
+        channel = ev['channel'].tolist()
+        velocity = ev['velocity'].tolist()
+
+        start = np.flatnonzero(np.diff(ev['group'], prepend=-1)).tolist()
+        end = start[1:] + [ev.size]
+
+        return [
+            {'abs_time': abs_time[i],
+             'event': [{'note': note[j],
+                        'channel': channel[j],
+                        'velocity': velocity[j]} for j in range(i, k)]}
+            for i, k in zip(start, end)
+        ]
 
-        for e in ev:
-            v_data.append({'abs_time': e['abs_time'],
-                           'chr': copy.deepcopy(prev_chr_list)})
+    def mk_event_list(self, data):
+        """
+        Parameters
+        ----------
+        data: NoteTable or list of NoteInfo
 
-            for e1 in e['event']:
-                note = e1['note']
+        Returns
+        -------
+        sorted_ev: list of NoteEvent
+            dict view of ``mk_event_array()``
+        """
+        return self.event_array_to_list(self.mk_event_array(data))
 
-                note_min = min(note, note_min)
-                note_max = max(note, note_max)
+    def mk_piano_roll(self, data):
+        """
+        Parameters
+        ----------
+        data: NoteTable or list of NoteInfo
 
-                if e1['velocity'] > 0:
-                    ch1 = self.V_CHR_START[e1['channel']]
-                    on_count[note] += 1
-                    ch2 = self.V_CHR_ON
-                else:
-                    ch1 = self.V_CHR_STOP[e1['channel']]
-                    on_count[note] -= 1
-                    if on_count[note] > 0:
-                        ch2 = self.V_CHR_ON
-                    else:
-                        ch2 = self.V_CHR_OFF
+        Returns
+        -------
+        piano_roll: PianoRoll
+        """
+        return PianoRoll.from_events(self.mk_event_array(data))
 
-                v_data[-1]['chr'][note] = ch1
-                prev_chr_list[note] = ch2
+    def mk_visual(self, data):
+        """
+        Parameters
+        ----------
+        data: NoteTable or list of NoteInfo
 
-        self._log.debug('note_min/max=%s', (note_min, note_max))
+        Returns
+        -------
+        v_data: dict
+            {'note_min': int, 'note_max': int,
+             'data': [{'abs_time': float, 'chr': str}, ..],
+             'piano_roll': PianoRoll}
+        """
+        piano_roll = self.mk_piano_roll(data)
+        self._log.debug('%s', piano_roll)
 
-        for v_ent in v_data:
-            v_ent['chr'] = ''.join(v_ent['chr'][note_min:note_max+1])
+        v_data = [{'abs_time': t, 'chr': c}
+                  for t, c in zip(piano_roll.abs_time.tolist(),
+                                  piano_roll.rows())]
 
         out_data = {
-            'note_min': note_min,
-            'note_max': note_max,
-            'data': v_data
+            'note_min': piano_roll.note_min,
+            'note_max': piano_roll.note_max,
+            'data': v_data,
+            'piano_roll': piano_roll
         }
         return out_data
 
-    def print_visual(self, v_data, channel_set):
+    def print_visual(self, v_data, channel_set, out=None):
         """
         Parameters
         ----------
-        v_data: {abs_time: v_str}
+        v_data: dict
+            output of ``mk_visual()``
         channel_set: set of int
+        out: file like object
+            default: sys.stdout
         """
         self._log.debug('note_min/max=%s', (
             v_data['note_min'], v_data['note_max']))
         self._log.debug('channel_set=%s', channel_set)
 
-        note_min = v_data['note_min']
-        note_max = v_data['note_max']
+        with VisualWriter(out, debug=self._dbg) as writer:
+            if 'piano_roll' in v_data:
+                writer.write_piano_roll(v_data['piano_roll'], channel_set)
+                return
 
-        for i in [0, 1, 2]:
-            print('%8s|' % ' ', end='')
-            for n in range(note_min, note_max+1):
-                print(('%03d' % (n))[i], end='')
+            writer.write_visual(v_data['note_min'], v_data['note_max'],
+                                [v['abs_time'] for v in v_data['data']],
+                                [v['chr'] for v in v_data['data']],
+                                channel_set)
 
-            print('|')
 
-        print('--------+' + '-' * (note_max - note_min + 1) + '+')
-
-        for v_ent in v_data['data']:
-            print('%08.3f|%s|' % (v_ent['abs_time'], v_ent['chr']))
-
-        print('--------+' + '-' * (note_max - note_min + 1) + '+')
-
-        for i in [0, 1, 2]:
-            print('%8s|' % ' ', end='')
-            for n in range(note_min, note_max+1):
-                print(('%03d' % (n))[i], end='')
-
-            print('|')
-
-        print()
-
-        for c in sorted(list(channel_set)):
-            print('CH(%2d): %s--%s' % (
-                c, self.V_CHR_START[c], self.V_CHR_STOP[c]))
+def _parse_worker(parser_args, midi_file, channel):
+    """
+    worker function of ``Parser.parse_many()``
+    """
+    return Parser(**parser_args).parse_one(midi_file, channel)
@@ -9,14 +9,17 @@ __date__ = '2020'
 
 import time
 import threading
-import queue
-import pygame
-from .wav_utils import Wav
-from .midi_utils import note2freq
+from itertools import groupby
+import numpy as np
+from .sample_bank import SampleBank
+from .audio_backend import PygameBackend
+from .clock import Clock
+from .note_info import NoteInfo
+from .note_table import as_note_table
 from .my_logger import get_logger
 
 
-class Player:
+class Player:  # pylint: disable=too-many-instance-attributes
     """
     MIDI parser for Music Box
     """
@@ -27,26 +30,80 @@ class Player:
 
     FIRST_DELAY_MAX = 3  # sec
 
-    def __init__(self, rate=DEF_RATE, debug=False):
+    PRELOAD_SEC = 5.0  # sec
+
+    TAIL_FADE_SEC = 0.01  # sec .. fade-in of the sound resumed on the way
+
+    SPIN_SEC = 0.002  # sec
+
+    STATE_PLAY = 'play'
+    STATE_PAUSE = 'pause'
+    STATE_STOP = 'stop'
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 rate=DEF_RATE, debug=False, *,
+                 workers=None, sample_bank=None, spin=False, metrics=None,
+                 backend=None, clock=None):
         """ Constructor
 
         Parameters
         ----------
-        midi_file: str
-            file name of MIDI file
+        rate: int
+            sampling rate [Hz]
+        workers: int or None
+            number of threads to make sounds (None or <= 1: no thread)
+        sample_bank: SampleBank or None
+            None: ``SampleBank.shared()``
+        spin: bool
+            spin-wait for the last ``SPIN_SEC`` before each note
+            (more accurate, but uses CPU)
+        metrics: PlayMetrics or None
+            collect timing metrics (None: disabled)
+        backend: AudioBackend or None
+            None: ``PygameBackend``
+        clock: Clock or None
+            None: ``Clock`` (real time)
+            ``VirtualClock``: simulate playing faster than real time
         """
         self._dbg = debug
         self.__log = get_logger(__class__.__name__, self._dbg)
-        self.__log.debug('rate=%s', rate)
+        self.__log.debug('rate=%s, workers=%s', rate, workers)
+        self.__log.debug('spin=%s', spin)
 
         self._rate = rate
+        self._workers = workers
+        self._spin = spin
+        self._metrics = metrics
+        self._bank = sample_bank
+        if self._bank is None:
+            self._bank = SampleBank.shared()
 
         self._sec_min = self.SEC_MIN
         self._sec_max = self.SEC_MAX
 
-        pygame.mixer.init(frequency=self._rate, channels=1)
+        self._clock = clock if clock is not None else Clock()
+
+        self._backend = backend
+        if self._backend is None:
+            self._backend = PygameBackend(self._rate, debug=self._dbg)
 
         self._snd = {}
+        self._tail_keys = []
+
+        self._table = None
+        self._keys = []
+
+        # state of ``start()``
+        self._play_th = None
+        self._cond = threading.Condition()
+        self._ctrl = threading.Event()  # wakes up ``sleep_until()``
+        self._state = None
+        self._seek_pos = None
+        self._pos_sec = 0.0
+        self._next_sec = 0.0
+        self._clock_base = None
+
+        self.onset_error = []
 
     @staticmethod
     def within_range(num, n_min, n_max):
@@ -55,6 +112,26 @@ class Player:
         """
         return min(max(num, n_min), n_max)
 
+    @staticmethod
+    def key_sec(sec, sec_min, sec_max):
+        """
+        Parameters
+        ----------
+        sec: np.ndarray of float
+            length of notes
+
+        Returns
+        -------
+        key_sec: np.ndarray of float
+            quantized length of notes
+        """
+        sec = np.clip(sec, sec_min, sec_max)
+
+        # 0.5秒を超える場合は、0.02 単位に丸める
+        return np.where(sec > 0.5,
+                        np.round(np.round(sec / 2.0, 2) * 2, 2),
+                        np.round(sec, 2))
+
     def snd_key(self, note_data, sec_min, sec_max):
         """
         Returns
@@ -62,86 +139,150 @@ class Player:
         key: tuple of int
             (note_num, sec)
         """
-        sec = self.within_range(note_data.length(), sec_min, sec_max)
-
-        if sec > 0.5:
-            # 0.02 単位に丸める
-            key_sec = round(round(sec / 2.0, 2) * 2, 2)
-        else:
-            key_sec = round(sec, 2)
+        key_sec = self.key_sec(np.array([note_data.length()]),
+                               sec_min, sec_max)
 
-        key = (note_data.note, key_sec)
+        key = (note_data.note, key_sec.tolist()[0])
         return key
 
-    def mk_wav(self, in_data, sec_min, sec_max):
+    def snd_keys(self, in_data, sec_min, sec_max):
         """
-        make sound data
+        Parameters
+        ----------
+        in_data: NoteTable or list of NoteInfo
+
+        Returns
+        -------
+        keys: list of tuple
+            sound key of each note
         """
-        for i, note_info in enumerate(in_data):
-            if note_info.velocity == 0:
-                continue
+        table = as_note_table(in_data)
 
-            key = self.snd_key(note_info, sec_min, sec_max)
+        key_sec = self.key_sec(table.length(), sec_min, sec_max)
 
-            if key in self._snd.keys():
-                continue
+        return list(zip(table.note.tolist(), key_sec.tolist()))
 
-            # self.__log.debug('(%4d) new key: %s', i, key)
+    def mk_sound(self, key):
+        """
+        make sound of the key, if not exist
 
-            freq = note2freq(note_info.note)
-            sec = self.within_range(note_info.length(), sec_min, sec_max)
+        Parameters
+        ----------
+        key: tuple
+            (note_num, key_sec)
 
-            wav = Wav(freq, sec, self._rate).wav
+        Returns
+        -------
+        snd: any
+            sound object of the backend
+        """
+        snd = self._snd.get(key)
 
-            self._snd[key] = pygame.sndarray.make_sound(wav)
+        if snd is None:
+            wav = self._bank.get(self._rate, key[0], key[1])
+            snd = self.make_sound(wav)
+            self._snd[key] = snd
 
-        return self._snd
+        return snd
 
-    def play_sound(self, note_info, sec_min, sec_max) -> None:
+    def make_sound(self, wav):
         """
-        play sound
+        Parameters
+        ----------
+        wav: np.ndarray of int16
+
+        Returns
+        -------
+        snd: any
+            sound object of the backend
         """
-        key = self.snd_key(note_info, sec_min, sec_max)
+        if self._metrics is None:
+            return self._backend.make_sound(wav)
+
+        start = time.perf_counter()
+        snd = self._backend.make_sound(wav)
+        self._metrics.record(self._metrics.MAKE_SOUND,
+                             time.perf_counter() - start)
+        return snd
+
+    def mk_sounds(self, keys):
+        """
+        make sounds of the keys, if not exist
+
+        Sound data are taken from the sample bank
+        (see ``SampleBank.get_many()``).
+
+        Parameters
+        ----------
+        keys: iterable of tuple
+            (note_num, key_sec)
+
+        Returns
+        -------
+        n_made: int
+            number of sounds made
+        """
+        keys = [key for key in dict.fromkeys(keys) if key not in self._snd]
+
+        wavs = self._bank.get_many(self._rate, keys, self._workers)
 
-        snd = self._snd[key]
-        vol = note_info.velocity / 128 / 8
-        # maxtime = int(sec_max * self.SND_PLAY_FACTOR)
+        for key, wav in wavs.items():
+            self._snd[key] = self.make_sound(wav)
 
-        snd.set_volume(vol)
-        # snd.play(fade_ms=5, maxtime=maxtime)
-        snd.play()
+        return len(wavs)
 
-    def play_th(self, note_q, sec_min, sec_max):
+    def mk_wav(self, in_data, sec_min, sec_max):
         """
-        play thread
+        make sound data
+
+        Parameters
+        ----------
+        in_data: NoteTable or list of NoteInfo
         """
-        my_clock_base = -1
+        table = as_note_table(in_data)
+        table = table[table.velocity > 0]
 
-        while True:
-            note_info = note_q.get()
+        self.mk_sounds(self.snd_keys(table, sec_min, sec_max))
 
-            if not note_info:
-                break
+        return self._snd
+
+    def play_sound(self, note_info, sec_min, sec_max) -> None:
+        """
+        play sound
+        """
+        key = self.snd_key(note_info, sec_min, sec_max)
 
-            if my_clock_base < 0:
-                my_clock_base = time.time() - note_info.abs_time
+        self.play_key(key, note_info.velocity)
 
-            now = time.time() - my_clock_base
+    def play_key(self, key, velocity) -> None:
+        """
+        play sound of the key
+        """
+        snd = self._snd.get(key)
+        if snd is None:
+            # not made yet (see ``play()``)
+            snd = self.mk_sound(key)
+
+        vol = velocity / 128 / 8
 
-            self.play_sound(note_info, sec_min, sec_max)
-            print('%08.3f / %s' % (now, note_info))
+        self._backend.play(key, snd, vol)
 
-    def play(self, parsed_midi,  # pylint: disable=too-many-locals
+    def play(self, parsed_midi,
              pos_sec=0.0,
-             sec_min=SEC_MIN, sec_max=SEC_MAX) -> None:
+             sec_min=SEC_MIN, sec_max=SEC_MAX,
+             pos_tick=None) -> None:
         """
-        play parsed midi data
+        play parsed midi data (blocking)
+
+        ``start()`` and ``wait()``.
+        ``pause()``, ``seek()`` etc. can be called from other threads.
 
         Parameters
         ----------
         parsed_data: {
             'channel_set': set of int,
-            'note_info': list of NoteInfo
+            'note_info': NoteTable or list of NoteInfo,
+            'tempo_map': TempoMap (required for ``pos_tick``)
         }
         pos_sec: float
             seek position in sec
@@ -149,7 +290,31 @@ class Player:
             min sound length
         sec_max: int
             max sound length
+        pos_tick: int or None
+            seek position in tick (overrides ``pos_sec``)
         """
+        self.start(parsed_midi, pos_sec, sec_min, sec_max, pos_tick)
+        self.wait()
+
+    def start(self, parsed_midi,
+              pos_sec=0.0,
+              sec_min=SEC_MIN, sec_max=SEC_MAX,
+              pos_tick=None) -> None:
+        """
+        start playing parsed midi data in a thread (non-blocking)
+
+        Notes sounding at ``pos_sec`` are restarted
+        for their remaining length.
+        While playing, ``pause()``, ``resume()``, ``seek()`` and ``stop()``
+        control the thread, without making the sounds again.
+
+        Parameters
+        ----------
+        (same as ``play()``)
+        """
+        if pos_tick is not None:
+            pos_sec = parsed_midi['tempo_map'].tick2sec(pos_tick)
+
         self.__log.debug('parsed_midi[channel_set]=%s,',
                          parsed_midi['channel_set'])
         self.__log.debug('length of parsed_midi[data]=%s',
@@ -157,66 +322,403 @@ class Player:
         self.__log.debug('pos_sec=%s', pos_sec)
         self.__log.debug('sec: %s .. %s', sec_min, sec_max)
 
-        data = parsed_midi['note_info']
+        if self.is_playing():
+            self.stop()
+            self.wait()
 
-        snd = self.mk_wav(parsed_midi['note_info'], sec_min, sec_max)
-        self.__log.info('len(snd)=%s', len(snd))
+        self._table = as_note_table(parsed_midi['note_info'])
+        self._keys = self.snd_keys(self._table, sec_min, sec_max)
 
-        abs_time = 0
+        idx = self._table.interval_index().seek(pos_sec)
+        idx = idx[self._table.velocity[idx] > 0]
 
-        note_q: queue.Queue = queue.Queue()
+        # make sounds for the first PRELOAD_SEC, and start playing.
+        # the rest are made in background
+        abs_time = self._table.abs_time[idx]
+        n_first = 0
+        if idx.size > 0:
+            n_first = int(np.searchsorted(
+                abs_time, abs_time[0] + self.PRELOAD_SEC, side='right'))
+
+        idx = idx.tolist()
+        n_snd = self.mk_sounds(self._keys[i] for i in idx[:n_first])
+        self.__log.info('len(snd)=%s', n_snd)
 
         th = threading.Thread(  # pylint: disable=invalid-name
-            target=self.play_th,
-            args=(note_q, sec_min, sec_max),
+            target=self.mk_sounds,
+            args=([self._keys[i] for i in idx[n_first:]],),
             daemon=True)
         th.start()
 
-        my_clock_base = -1.0
-        now = 0.0
-        clock_delay = 0.0
+        with self._cond:
+            self._state = self.STATE_PLAY
+            self._seek_pos = None
+            self._ctrl.clear()
 
-        for i, note_info in enumerate(data):
-            if note_info.abs_time < pos_sec:
-                continue
+        self._pos_sec = pos_sec
+        self.onset_error = []
+        self._play_th = threading.Thread(target=self._run, args=(pos_sec,),
+                                         daemon=True)
+        self._play_th.start()
 
-            self.__log.debug('(%4d) %s', i, note_info)
+    def wait(self, timeout=None) -> bool:
+        """
+        wait for the end of ``start()``
 
-            delay = note_info.abs_time - abs_time
-            self.__log.debug('delay=%s', delay)
+        Parameters
+        ----------
+        timeout: float or None
+            [sec] (None: forever)
 
-            if i == 0 and delay > self.FIRST_DELAY_MAX:
-                self.__log.warning('delay:%s too long ..', delay)
-                delay = self.FIRST_DELAY_MAX
-                self.__log.warning('[fix] delay=%s', delay)
+        Returns
+        -------
+        finished: bool
+        """
+        if self._play_th is not None:
+            self._play_th.join(timeout)
 
-            if delay > 0:
-                delay -= clock_delay  # time adjustment
-                if delay <= 0:
-                    delay = 0.001
+        return not self.is_playing()
 
-                time.sleep(delay)
+    def is_playing(self) -> bool:
+        """
+        Returns
+        -------
+        playing: bool
+            the thread of ``start()`` is running (including paused)
+        """
+        return self._play_th is not None and self._play_th.is_alive()
 
-            # calc clock_delay
-            if my_clock_base < 0:
-                my_clock_base = time.time() - note_info.abs_time
+    def is_paused(self) -> bool:
+        """
+        Returns
+        -------
+        paused: bool
+        """
+        return self._state == self.STATE_PAUSE
 
-            now = time.time() - my_clock_base
+    def position(self) -> float:
+        """
+        Returns
+        -------
+        pos_sec: float
+            current song position [sec]
+        """
+        if self._clock_base is None or self._state != self.STATE_PLAY:
+            return self._pos_sec
 
-            clock_delay = now - note_info.abs_time
-            self.__log.debug('%8.3f / %8.3f clock_delay=%s',
-                             now, note_info.abs_time, clock_delay)
+        return self._clock.now() - self._clock_base
 
-            abs_time = note_info.abs_time
-            self.__log.debug('abs_time=%s', abs_time)
+    def pause(self) -> None:
+        """
+        pause playing (``resume()`` to continue)
+        """
+        with self._cond:
+            if self._state == self.STATE_PLAY:
+                self._pos_sec = self.position()
+                self._state = self.STATE_PAUSE
+                self._ctrl.set()
 
-            if note_info.velocity == 0:
-                continue
+    def resume(self) -> None:
+        """
+        resume paused playing
+        """
+        with self._cond:
+            if self._state == self.STATE_PAUSE:
+                self._state = self.STATE_PLAY
+                self._cond.notify_all()
+
+    def seek(self, pos_sec) -> None:
+        """
+        move the playing position
+
+        Notes sounding at ``pos_sec`` are restarted
+        for their remaining length.
+        If paused, it is effective on ``resume()``.
+
+        Parameters
+        ----------
+        pos_sec: float
+            [sec]
+        """
+        with self._cond:
+            self._seek_pos = max(pos_sec, 0.0)
+            self._pos_sec = self._seek_pos
+            self._ctrl.set()
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        """
+        stop playing (the thread of ``start()`` ends)
+        """
+        with self._cond:
+            if self._state is not None:
+                self._state = self.STATE_STOP
+                self._ctrl.set()
+                self._cond.notify_all()
+
+    def _run(self, pos_sec) -> None:
+        """
+        play thread of ``start()``
+
+        Parameters
+        ----------
+        pos_sec: float
+            start position [sec]
+        """
+        restart = True
+        first = True  # clamp the first delay only at the start
+        next_sec = pos_sec  # start time of the next notes
+
+        while True:
+            pos = self.play_notes(self.notes_from(next_sec, restart), pos_sec,
+                                  first)
+            if pos is None:
+                break
+
+            first = False
+
+            with self._cond:
+                self._pos_sec = pos
+
+                if self._state == self.STATE_PAUSE:
+                    self.__log.debug('pause: pos=%.3f', pos)
+                    self._backend.pause()
+
+                    while self._state == self.STATE_PAUSE:
+                        self._cond.wait()
 
-            note_q.put(note_info)
+                    self._backend.resume()
+
+                if self._state == self.STATE_STOP:
+                    self._backend.stop()
+                    break
+
+                self._ctrl.clear()
+
+                restart = self._seek_pos is not None
+                if restart:
+                    self.__log.debug('seek: pos=%.3f', self._seek_pos)
+                    self._backend.stop()
+                    pos = self._seek_pos
+                    self._seek_pos = None
+                    next_sec = pos
+                else:
+                    # not to play the played notes again
+                    next_sec = self._next_sec
+
+                pos_sec = pos
+                self._pos_sec = pos
+                self._clock_base = None
+
+        with self._cond:
+            self._state = None
+            self._clock_base = None
+            self._ctrl.clear()
+
+    def notes_from(self, pos_sec, restart=True):
+        """
+        notes to be played from ``pos_sec``
+
+        Parameters
+        ----------
+        pos_sec: float
+            [sec]
+        restart: bool
+            include notes sounding at ``pos_sec``
+            (restarted at ``pos_sec`` for their remaining length)
+
+        Returns
+        -------
+        notes: list of (key, NoteInfo)
+            in start time order (see ``play_notes()``)
+        """
+        table = self._table
+        index = table.interval_index()
+
+        notes = []
+
+        if restart:
+            for key in self._tail_keys:
+                self._snd.pop(key, None)
+            self._tail_keys = []
+
+            idx = index.at(pos_sec)
+            idx = idx[(table.abs_time[idx] < pos_sec)
+                      & (table.velocity[idx] > 0)]
+
+            for i in idx.tolist():
+                key = self.mk_tail(self._keys[i],
+                                   pos_sec - float(table.abs_time[i]))
+                if key is None:
+                    continue
+
+                note_info = table[i]
+                notes.append((key, NoteInfo(pos_sec, note_info.channel,
+                                            note_info.note,
+                                            note_info.velocity,
+                                            note_info.end_time)))
+
+        idx = index.seek(pos_sec)
+        idx = idx[table.velocity[idx] > 0]
+
+        notes.extend((self._keys[i], table[i]) for i in idx.tolist())
+
+        return notes
+
+    def mk_tail(self, key, offset):
+        """
+        make the remaining part of the sound of the key
 
-        note_q.put(None)
-        th.join()
-        time.sleep(.5)
+        Parameters
+        ----------
+        key: tuple
+            (note_num, key_sec)
+        offset: float
+            elapsed time of the sound [sec]
+
+        Returns
+        -------
+        tail_key: tuple or None
+            (note_num, key_sec, offset)
+            None: nothing remains
+        """
+        wav = self._bank.get(self._rate, key[0], key[1])
+
+        pos = int(round(offset * self._rate))
+        if pos >= wav.size:
+            return None
+
+        wav = wav[pos:].copy()
+
+        # fade in to avoid click
+        n_fade = min(int(self.TAIL_FADE_SEC * self._rate), wav.size)
+        wav[:n_fade] = (wav[:n_fade]
+                        * np.linspace(0, 1, n_fade)).astype(np.int16)
+
+        tail_key = key + (round(offset, 3),)
+        self._snd[tail_key] = self.make_sound(wav)
+        self._tail_keys.append(tail_key)
+
+        return tail_key
+
+    def play_stream(self, note_iter,
+                    pos_sec=0.0,
+                    sec_min=SEC_MIN, sec_max=SEC_MAX) -> None:
+        """
+        play NoteInfo stream (e.g. ``Parser.parse_iter()``)
+
+        Sounds are made on demand, so that playing starts
+        before the whole stream is read.
+
+        Parameters
+        ----------
+        note_iter: iterable of NoteInfo
+            in start time order
+        pos_sec: float
+            seek position in sec
+        sec_min: int
+            min sound length
+        sec_max: int
+            max sound length
+        """
+        self.__log.debug('pos_sec=%s', pos_sec)
+        self.__log.debug('sec: %s .. %s', sec_min, sec_max)
+
+        def mk_notes():
+            for note_info in note_iter:
+                if note_info.velocity == 0 or note_info.abs_time < pos_sec:
+                    continue
+
+                key = self.snd_key(note_info, sec_min, sec_max)
+                self.mk_sound(key)
+                yield (key, note_info)
+
+        self.onset_error = []
+        self.play_notes(mk_notes(), pos_sec)
+
+    def sleep_until(self, deadline) -> bool:
+        """
+        sleep until the deadline
+
+        Parameters
+        ----------
+        deadline: float
+            ``clock.now()`` value
+
+        Returns
+        -------
+        interrupted: bool
+            woken up by ``pause()``, ``seek()`` or ``stop()``
+        """
+        return self._clock.sleep_until(deadline,
+                                       self.SPIN_SEC if self._spin else 0.0,
+                                       self._ctrl)
+
+    def play_notes(self, notes, pos_sec=0.0, first=True):
+        """
+        play notes
+
+        Each group of notes with the same ``abs_time`` is played
+        at once, at an absolute deadline on the clock
+        (``time.perf_counter()`` by default).
+        So errors do not accumulate.
+        Onset errors (actual - scheduled) [sec] of all notes are
+        appended to ``self.onset_error``
+        (cleared by ``start()`` and ``play_stream()``, not by
+        ``pause()``/``resume()``/``seek()``).
+
+        Parameters
+        ----------
+        notes: iterable of (key, NoteInfo)
+            in start time order, and the sounds of the keys exist
+        pos_sec: float
+            seek position in sec
+        first: bool
+            limit the delay to the first notes to ``FIRST_DELAY_MAX``
+            (False: resume after ``pause()`` or ``seek()``)
+
+        Returns
+        -------
+        pos_sec: float or None
+            song position, when interrupted by
+            ``pause()``, ``seek()`` or ``stop()``
+            (None: played to the end)
+        """
+        self._clock_base = None
+
+        for abs_time, batch in groupby(notes, key=lambda n: n[1].abs_time):
+            if self._clock_base is None:
+                delay = abs_time - pos_sec
+                if first and delay > self.FIRST_DELAY_MAX:
+                    self.__log.warning('delay:%s too long ..', delay)
+                    delay = self.FIRST_DELAY_MAX
+                    self.__log.warning('[fix] delay=%s', delay)
+
+                # song time = clock.now() - clock_base
+                self._clock_base = self._clock.now() + delay - abs_time
+
+            deadline = self._clock_base + abs_time
+            wait_start = self._clock.now()
+            if self.sleep_until(deadline):
+                self._next_sec = abs_time
+                return min(self._clock.now() - self._clock_base, abs_time)
+
+            batch = list(batch)
+            for key, note_info in batch:
+                self.play_key(key, note_info.velocity)
+                self.onset_error.append(self._clock.now() - deadline)
+
+            if self._metrics is not None:
+                self._metrics.record(self._metrics.WAIT,
+                                     max(deadline - wait_start, 0.0))
+                for err in self.onset_error[-len(batch):]:
+                    self._metrics.record(self._metrics.LATENESS, err)
+
+            now = self._clock.now() - self._clock_base
+            for _, note_info in batch:
+                print('%08.3f / %s' % (now, note_info))
+
+        self._backend.finish()
 
         print('end music')
+        return None
@@ -23,28 +23,120 @@ $ ./mu.py file.mid
 __author__ = 'Yoichi Tanibayashi'
 __date__ = '2020'
 
-from .my_logger import get_logger
+import os
+import numpy as np
 
 
 FREQ_BASE = 440
 NOTE_BASE = 69
 NOTE_N = 128
 
-LOG = get_logger(__name__)
 
-def note2freq(note):
+def mk_freq_table(freq_base=FREQ_BASE, temperament=None):
+    """
+    make frequency table of all MIDI notes
+
+    Parameters
+    ----------
+    freq_base: float
+        frequency of A4 (``NOTE_BASE``) [Hz]
+    temperament: array like of 12 float or None
+        pitch of C, C#, D, .. B in cents from C
+        (e.g. ``[0, 90, 204, 294, 408, 498, 588, 702, 792, 906, 996,
+        1110]`` for Pythagorean)
+        None: equal temperament (``[0, 100, 200, .. 1100]``)
+
+    Returns
+    -------
+    freq_table: np.ndarray of float64
+        shape: (NOTE_N,)
+    """
+    if temperament is None:
+        # same values as ``freq_base * 2 ** ((note - NOTE_BASE) / 12)``
+        # in Python float
+        return np.array([freq_base * 2.0 ** ((n - NOTE_BASE) / 12.0)
+                         for n in range(NOTE_N)], dtype=np.float64)
+
+    note = np.arange(NOTE_N)
+
+    cents = np.asarray(temperament, dtype=np.float64)
+    if cents.shape != (12,):
+        raise ValueError('invalid `temperament`: 12 values are required')
+
+    # relative to A4
+    cents = ((note // 12 - NOTE_BASE // 12) * 1200.0
+             + cents[note % 12] - cents[NOTE_BASE % 12])
+
+    return freq_base * 2.0 ** (cents / 1200.0)
+
+
+FREQ_TABLE = mk_freq_table()
+
+
+def note2freq(note, freq_table=None):
     """
     MIDI note number to frequency
 
+    Integer notes in 0 .. NOTE_N - 1 are looked up in the table.
+    Other notes (float, or out of the range) are calculated
+    in equal temperament, from A4 of the table.
+
     Parameters
     ----------
-    note: int
+    note: int or float or array like of them
+    freq_table: np.ndarray or None
+        see ``mk_freq_table()`` (None: ``FREQ_TABLE``)
 
     Returns
     -------
-    freq: float
+    freq: float or np.ndarray of float64
     """
-    LOG.debug('note=%s', note)
+    if freq_table is None:
+        freq_table = FREQ_TABLE
+
+    if isinstance(note, (int, np.integer)):
+        if 0 <= note < NOTE_N:
+            return float(freq_table[note])
+
+        return float(freq_table[NOTE_BASE] * 2.0 ** ((note - NOTE_BASE)
+                                                      / 12.0))
+
+    note = np.asarray(note)
+
+    freq = freq_table[NOTE_BASE] * 2.0 ** ((note - NOTE_BASE) / 12.0)
+    if freq.ndim == 0:
+        return float(freq)
+
+    if note.dtype.kind in 'iu':
+        in_range = (note >= 0) & (note < NOTE_N)
+        freq[in_range] = freq_table[note[in_range]]
 
-    freq = FREQ_BASE * 2.0 ** (float(note - NOTE_BASE)/12.0)
     return freq
+
+
+def find_midi_files(paths):
+    """
+    find MIDI files
+
+    Parameters
+    ----------
+    paths: list of str
+        MIDI files or directories (searched recursively)
+
+    Returns
+    -------
+    midi_files: list of str
+        sorted
+    """
+    midi_files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            midi_files.append(path)
+            continue
+
+        for dirpath, _, filenames in os.walk(path):
+            for fname in filenames:
+                if fname.lower().endswith(('.mid', '.midi')):
+                    midi_files.append(os.path.join(dirpath, fname))
+
+    return sorted(midi_files)
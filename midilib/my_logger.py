@@ -3,17 +3,23 @@
 #
 """
 my_logger.py
+
+Loggers are created once, and cached by name.
+The handler is added only once.
+
+In hot paths (per note, per event ..), guard debug calls by
+``if self._dbg:`` (or ``if logger.isEnabledFor(DEBUG):``),
+not to format arguments and call the logger when debug is off.
 """
 __author__ = 'Yoichi Tanibayashi'
 __date__ = '2021'
 
-import inspect
 from logging import getLogger, StreamHandler, Formatter
 from logging import DEBUG, INFO
 # from logging import NOTSET, DEBUG, INFO, WARNING, ERROR, CRITICAL
 
 FMT_HDR = '%(asctime)s %(levelname)s '
-FMT_LOC = '%(name)s.%(funcName)s:%(lineno)d> '
+FMT_LOC = '%(filename)s.%(name)s.%(funcName)s:%(lineno)d> '
 HANDLER_FMT = Formatter(FMT_HDR + FMT_LOC + '%(message)s',
                         datefmt='%H:%M:%S')
 
@@ -21,29 +27,57 @@ CONSOLE_HANDLER = StreamHandler()
 CONSOLE_HANDLER.setFormatter(HANDLER_FMT)
 CONSOLE_HANDLER.setLevel(DEBUG)
 
-def get_logger(name, dbg=False):
-    """
-    get logger
+_LOGGERS = {}
+
+
+def dbg2level(dbg):
     """
-    filename = inspect.stack()[1].filename.split('/')[-1]
-    name = filename + '.' + name
-    logger = getLogger(name)
-    logger.propagate = False
-    logger.addHandler(CONSOLE_HANDLER)
-    logger.setLevel(INFO)
+    Parameters
+    ----------
+    dbg: bool or int
+        True: DEBUG, False: INFO, int: logging level
 
+    Returns
+    -------
+    level: int
+    """
     # [Important !! ]
     # isinstance()では、boolもintと判定されるので、
     # 先に bool かどうかを判定する
 
     if isinstance(dbg, bool):
-        if dbg:
-            logger.setLevel(DEBUG)
-
-        return logger
+        return DEBUG if dbg else INFO
 
     if isinstance(dbg, int):
-        logger.setLevel(dbg)
-        return logger
+        return dbg
 
     raise ValueError('invalid `dbg` value: %s' % (dbg))
+
+
+def get_logger(name, dbg=False):
+    """
+    get logger
+
+    The logger of ``name`` is created at the first call, and
+    the same logger is returned after that.
+    The level is set only when it changes
+    (``Logger.setLevel()`` clears the level cache of all loggers).
+
+    The file name of the caller is shown by the formatter
+    (``%(filename)s``), without inspecting the stack.
+    """
+    level = dbg2level(dbg)
+
+    logger = _LOGGERS.get(name)
+    if logger is None:
+        logger = getLogger(name)
+        logger.propagate = False
+        if CONSOLE_HANDLER not in logger.handlers:
+            logger.addHandler(CONSOLE_HANDLER)
+
+        _LOGGERS[name] = logger
+
+    if logger.level != level:
+        logger.setLevel(level)
+
+    return logger
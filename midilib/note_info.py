@@ -0,0 +1,77 @@
+#
+# (c) 2020 Yoichi Tanibayashi
+#
+"""
+parsed MIDI data entity
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+
+class NoteInfo:
+    """
+    parsed MIDI data entity
+
+    Attributes
+    ----------
+    abs_time: float
+        sec >= 0
+    channel: int
+        0 .. 15
+    note: int
+        0 .. 127
+    velocity: int
+        0 .. 127
+    end_time: float
+        sec >= abs_time >= 0
+
+    Notes
+    -----
+    note毎に作られるので、``__slots__`` を使い、
+    インスタンス毎のロガーも持たない(軽量化)。
+    """
+    __slots__ = ('abs_time', 'channel', 'note', 'velocity', 'end_time')
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 abs_time=None, channel=None, note=None,
+                 velocity=None, end_time=None,
+                 debug=False):  # pylint: disable=unused-argument
+        """ Constructor
+
+        Parameters
+        ----------
+        debug: bool
+            not used (for compatibility)
+        """
+        self.abs_time = round(abs_time, 3)
+        self.channel = channel
+        self.note = note
+        self.velocity = velocity
+        self.end_time = None
+        if isinstance(end_time, float):
+            self.end_time = round(end_time, 3)
+
+    def __str__(self):
+        """
+        Returns
+        -------
+        str_data: str
+
+        """
+        str_data = 'start:%08.3f channel:%02d note:%03d velocity:%03d' % (
+            self.abs_time, self.channel, self.note, self.velocity)
+
+        if self.end_time and isinstance(self.end_time, float):
+            str_data += ' end:%08.3f length:%05.2f' % (
+                self.end_time, self.length())
+
+        return str_data
+
+    def length(self):
+        """
+        Returns
+        -------
+        length: float
+            length of note [msec]
+        """
+        return self.end_time - self.abs_time
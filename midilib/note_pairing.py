@@ -0,0 +1,176 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+note on/off pairing engine
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+from collections import deque
+
+
+class NotePairing:
+    """
+    note on/off pairing engine
+
+    (channel, note) 毎に、鳴っている(note offを待っている) note を
+    deque で管理し、note off が来たら、ポリシーに従って対応する
+    note on を取り出す。
+
+    Overlap policy
+    --------------
+    FIFO: 'fifo'
+        note off は、最も古い note on に対応させる
+    LIFO: 'lifo'
+        note off は、最も新しい note on に対応させる
+    RETRIGGER: 'retrigger'
+        鳴っている note と同じ note の note on が来たら、
+        前の note をそこで終了させる
+        (前の note の note off は、次の note を終了させずに読み捨てる)
+
+    Simple Usage
+    ------------
+    ============================================================
+    pairing = NotePairing(NotePairing.FIFO)
+
+    cut_item = pairing.note_on(key, item)  # RETRIGGER only
+    item = pairing.note_off(key)  # None: unmatched
+    ..
+    remaining_items = pairing.flush()
+    ============================================================
+
+    Example (RETRIGGER: on, on, off, off)
+    -------------------------------------
+    >>> pairing = NotePairing(NotePairing.RETRIGGER)
+    >>> pairing.note_on((0, 60), 'a')
+    >>> pairing.note_on((0, 60), 'b')
+    'a'
+    >>> pairing.note_off((0, 60)) is None  # off of 'a' (already cut)
+    True
+    >>> pairing.note_off((0, 60))
+    'b'
+    >>> (pairing.unmatched_on, pairing.unmatched_off)
+    (0, 0)
+
+    Attributes
+    ----------
+    unmatched_on: int
+        number of note on without note off
+    unmatched_off: int
+        number of note off without note on
+    """
+    FIFO = 'fifo'
+    LIFO = 'lifo'
+    RETRIGGER = 'retrigger'
+
+    POLICIES = (FIFO, LIFO, RETRIGGER)
+
+    def __init__(self, policy=FIFO):
+        """ Constructor
+
+        Parameters
+        ----------
+        policy: str
+            overlap policy: 'fifo', 'lifo' or 'retrigger'
+        """
+        if policy not in self.POLICIES:
+            raise ValueError('invalid `policy` value: %s' % (policy))
+
+        self._policy = policy
+        self._open = {}
+        self._owed = {}  # {key: number of note off of cut notes}
+
+        self.unmatched_on = 0
+        self.unmatched_off = 0
+
+    def note_on(self, key, item):
+        """
+        Parameters
+        ----------
+        key: tuple of int
+            (channel, note)
+        item: any
+            object to be returned by ``note_off()``
+
+        Returns
+        -------
+        cut_item: any or None
+            item which is ended by this note on (RETRIGGER only)
+        """
+        queue = self._open.get(key)
+
+        if queue is None:
+            self._open[key] = deque([item])
+            return None
+
+        if self._policy == self.RETRIGGER and queue:
+            cut_item = queue.popleft()
+            queue.append(item)
+
+            # the note off of the cut note is still coming
+            self._owed[key] = self._owed.get(key, 0) + 1
+            return cut_item
+
+        queue.append(item)
+        return None
+
+    def note_off(self, key):
+        """
+        Parameters
+        ----------
+        key: tuple of int
+            (channel, note)
+
+        Returns
+        -------
+        item: any or None
+            item of the paired note on
+            None: unmatched, or note off of a cut note (RETRIGGER)
+        """
+        owed = self._owed.get(key)
+        if owed:
+            if owed > 1:
+                self._owed[key] = owed - 1
+            else:
+                del self._owed[key]
+            return None
+
+        queue = self._open.get(key)
+
+        if not queue:
+            self.unmatched_off += 1
+            return None
+
+        if self._policy == self.LIFO:
+            item = queue.pop()
+        else:
+            item = queue.popleft()
+
+        if not queue:
+            del self._open[key]
+
+        return item
+
+    def open_count(self):
+        """
+        Returns
+        -------
+        count: int
+            number of notes waiting for note off
+        """
+        return sum(len(q) for q in self._open.values())
+
+    def flush(self):
+        """
+        Returns
+        -------
+        items: list of any
+            items of note on without note off
+        """
+        items = [item for q in self._open.values() for item in q]
+        self._open = {}
+        self._owed = {}
+
+        self.unmatched_on += len(items)
+        return items
@@ -0,0 +1,232 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Columnar (NumPy) note table
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import numpy as np
+from .note_info import NoteInfo
+from .interval_index import IntervalIndex
+
+
+class NoteTable:
+    """
+    columnar parsed MIDI data
+
+    ``list of NoteInfo`` と同じ情報を、
+    項目毎の NumPy array で保持する。
+    note毎にオブジェクトを作らないので、大量のファイルを
+    処理する場合でも、CPU・メモリを節約できる。
+
+    Attributes
+    ----------
+    abs_time: np.ndarray of float64
+        sec >= 0
+    end_time: np.ndarray of float64
+        sec >= abs_time >= 0
+    channel: np.ndarray of uint8
+        0 .. 15
+    note: np.ndarray of uint8
+        0 .. 127
+    velocity: np.ndarray of uint8
+        0 .. 127
+    """
+    CH_N = 16
+
+    DTYPE = np.dtype([('abs_time', np.float64),
+                      ('end_time', np.float64),
+                      ('channel', np.uint8),
+                      ('note', np.uint8),
+                      ('velocity', np.uint8)])
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 abs_time=(), end_time=(), channel=(), note=(),
+                 velocity=()):
+        """ Constructor
+
+        Parameters
+        ----------
+        abs_time, end_time: array like of float
+        channel, note, velocity: array like of int
+        """
+        self.abs_time = np.asarray(abs_time, dtype=np.float64)
+        self.end_time = np.asarray(end_time, dtype=np.float64)
+        self.channel = np.asarray(channel, dtype=np.uint8)
+        self.note = np.asarray(note, dtype=np.uint8)
+        self.velocity = np.asarray(velocity, dtype=np.uint8)
+
+        self._index = None
+
+    @classmethod
+    def from_note_info(cls, data):
+        """
+        Parameters
+        ----------
+        data: list of NoteInfo
+
+        Returns
+        -------
+        note_table: NoteTable
+        """
+        end_time = [np.nan if d.end_time is None else d.end_time
+                    for d in data]
+
+        return cls([d.abs_time for d in data], end_time,
+                   [d.channel for d in data],
+                   [d.note for d in data],
+                   [d.velocity for d in data])
+
+    @classmethod
+    def from_records(cls, rec):
+        """
+        Parameters
+        ----------
+        rec: np.ndarray of NoteTable.DTYPE
+
+        Returns
+        -------
+        note_table: NoteTable
+        """
+        return cls(rec['abs_time'], rec['end_time'], rec['channel'],
+                   rec['note'], rec['velocity'])
+
+    def to_records(self):
+        """
+        Returns
+        -------
+        rec: np.ndarray of NoteTable.DTYPE
+            structured array (picklable, savable by ``np.save()``)
+        """
+        rec = np.empty(len(self), dtype=self.DTYPE)
+        for name in self.DTYPE.names:
+            rec[name] = getattr(self, name)
+
+        return rec
+
+    def to_note_info(self):
+        """
+        Returns
+        -------
+        data: list of NoteInfo
+        """
+        return list(self)
+
+    def length(self):
+        """
+        Returns
+        -------
+        length: np.ndarray of float64
+            length of each note [sec]
+        """
+        return self.end_time - self.abs_time
+
+    def select_channels(self, channel):
+        """
+        Parameters
+        ----------
+        channel: list of int
+            selected channel
+
+        Returns
+        -------
+        note_table: NoteTable
+            notes of the channels (in the same order)
+        """
+        return self[np.isin(self.channel, np.asarray(channel, dtype=np.uint8))]
+
+    def group_by_channel(self):
+        """
+        sort notes by channel (stable: start time order in each channel)
+
+        Returns
+        -------
+        (note_table, offset): (NoteTable, np.ndarray of int64)
+            notes of channel ``ch`` are
+            ``note_table[offset[ch]:offset[ch + 1]]``
+        """
+        order = np.argsort(self.channel, kind='stable')
+
+        offset = np.zeros(self.CH_N + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.channel, minlength=self.CH_N),
+                  out=offset[1:])
+
+        return (self[order], offset)
+
+    def split_channels(self):
+        """
+        Returns
+        -------
+        tables: {int: NoteTable}
+            {channel: notes of the channel}
+            (views of one ``group_by_channel()`` result)
+        """
+        table, offset = self.group_by_channel()
+
+        return {ch: table[offset[ch]:offset[ch + 1]]
+                for ch in range(self.CH_N) if offset[ch + 1] > offset[ch]}
+
+    def interval_index(self):
+        """
+        Returns
+        -------
+        index: IntervalIndex
+            built at the first call, and reused
+        """
+        if self._index is None:
+            self._index = IntervalIndex.from_note_table(self)
+
+        return self._index
+
+    def __len__(self):
+        return self.abs_time.size
+
+    def __getitem__(self, idx):
+        """
+        Parameters
+        ----------
+        idx: int or slice or array of int/bool
+
+        Returns
+        -------
+        NoteInfo (int idx) or NoteTable (otherwise)
+        """
+        if isinstance(idx, (int, np.integer)):
+            end_time = float(self.end_time[idx])
+            if np.isnan(end_time):
+                end_time = None
+
+            return NoteInfo(float(self.abs_time[idx]),
+                            int(self.channel[idx]),
+                            int(self.note[idx]),
+                            int(self.velocity[idx]),
+                            end_time)
+
+        return NoteTable(self.abs_time[idx], self.end_time[idx],
+                         self.channel[idx], self.note[idx],
+                         self.velocity[idx])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __str__(self):
+        return 'NoteTable(%d notes)' % (len(self))
+
+
+def as_note_table(data):
+    """
+    Parameters
+    ----------
+    data: NoteTable or list of NoteInfo
+
+    Returns
+    -------
+    note_table: NoteTable
+    """
+    if isinstance(data, NoteTable):
+        return data
+
+    return NoteTable.from_note_info(data)
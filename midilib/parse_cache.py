@@ -0,0 +1,236 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Persistent cache of parsed MIDI data
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import os
+import json
+import hashlib
+import numpy as np
+from .note_table import NoteTable
+from .tempo_map import TempoMap
+from .my_logger import get_logger
+
+
+class ParseCache:
+    """
+    Persistent cache of parsed MIDI data
+
+    MIDIファイルの内容のハッシュと、パース・オプションをキーにして、
+    パース結果をディレクトリに保存する。
+
+    * ``<key>.npy``: ``NoteTable`` (structured array)
+      読み込み時は memory-map するだけなので、mido のデコードより
+      はるかに速い。
+    * ``<key>.json``: channel_set など
+
+    合計サイズが ``size_max`` を超えたら、
+    最後に使われた時刻が古いものから削除する(LRU)。
+
+    Simple Usage
+    ------------
+    ============================================================
+    cache = ParseCache(cache_dir)
+
+    key = cache.mk_key(midi_file, {'channel': None})
+    parsed_data = cache.load(key)
+    if parsed_data is None:
+        parsed_data = Parser().parse(midi_file, note_table=True)
+        cache.save(key, parsed_data)
+    ============================================================
+    """
+    VERSION = 1
+
+    DEF_SIZE_MAX = 256 * 1024 * 1024  # bytes
+
+    NOTE_SUFFIX = '.npy'
+    META_SUFFIX = '.json'
+
+    def __init__(self, cache_dir, size_max=DEF_SIZE_MAX, debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        cache_dir: str
+            cache directory (created if not exist)
+        size_max: int
+            max total size of cache files [bytes]
+        """
+        self._dbg = debug
+        self.__log = get_logger(__class__.__name__, self._dbg)
+        self.__log.debug('cache_dir=%s, size_max=%s', cache_dir, size_max)
+
+        self._cache_dir = cache_dir
+        self._size_max = size_max
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+
+    def mk_key(self, midi_file, options):
+        """
+        Parameters
+        ----------
+        midi_file: str
+        options: dict
+            parser options (JSON serializable)
+
+        Returns
+        -------
+        key: str
+        """
+        sha = hashlib.sha256()
+
+        with open(midi_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+
+        sha.update(json.dumps([self.VERSION, options],
+                              sort_keys=True).encode())
+
+        return sha.hexdigest()
+
+    def path(self, key, suffix):
+        """
+        Returns
+        -------
+        path: str
+        """
+        return os.path.join(self._cache_dir, key + suffix)
+
+    def load(self, key):
+        """
+        Parameters
+        ----------
+        key: str
+
+        Returns
+        -------
+        parsed_data: dict or None
+            'note_info' is memory-mapped ``NoteTable``
+            None: not cached
+        """
+        meta_path = self.path(key, self.META_SUFFIX)
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+
+            rec = np.load(self.path(key, self.NOTE_SUFFIX), mmap_mode='r')
+
+        except (OSError, ValueError) as ex:
+            self.__log.debug('%s: %s', type(ex).__name__, ex)
+            return None
+
+        # update last used time for LRU
+        os.utime(meta_path)
+
+        parsed_data = {
+            'channel_set': set(meta['channel_set']),
+            'note_info': NoteTable.from_records(rec),
+            'unmatched': meta['unmatched'],
+            'tempo_map': TempoMap(meta['ticks_per_beat'],
+                                  meta['tempo_list']),
+        }
+        return parsed_data
+
+    def save(self, key, parsed_data):
+        """
+        Parameters
+        ----------
+        key: str
+        parsed_data: dict
+            'note_info' is ``NoteTable``
+        """
+        tempo_map = parsed_data['tempo_map']
+
+        meta = {
+            'channel_set': sorted(parsed_data['channel_set']),
+            'unmatched': parsed_data['unmatched'],
+            'ticks_per_beat': tempo_map.ticks_per_beat,
+            'tempo_list': tempo_map.tempo_list(),
+        }
+
+        note_path = self.path(key, self.NOTE_SUFFIX)
+        meta_path = self.path(key, self.META_SUFFIX)
+
+        # write to temporary files and rename, for concurrent readers
+        tmp_suffix = '.%d.tmp' % (os.getpid())
+
+        with open(note_path + tmp_suffix, 'wb') as f:
+            np.save(f, parsed_data['note_info'].to_records())
+        os.replace(note_path + tmp_suffix, note_path)
+
+        with open(meta_path + tmp_suffix, 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+        self.evict()
+
+    def entries(self):
+        """
+        Returns
+        -------
+        entries: list of (float, int, str)
+            [(last used time, size, key), ..] in LRU order
+        """
+        entries = []
+
+        with os.scandir(self._cache_dir) as it:
+            for ent in it:
+                if not ent.name.endswith(self.META_SUFFIX):
+                    continue
+
+                key = ent.name[:-len(self.META_SUFFIX)]
+                try:
+                    size = ent.stat().st_size + os.path.getsize(
+                        self.path(key, self.NOTE_SUFFIX))
+                    entries.append((ent.stat().st_mtime, size, key))
+                except OSError:
+                    continue
+
+        return sorted(entries)
+
+    def remove(self, key):
+        """
+        Parameters
+        ----------
+        key: str
+        """
+        for suffix in (self.META_SUFFIX, self.NOTE_SUFFIX):
+            try:
+                os.remove(self.path(key, suffix))
+            except OSError:
+                pass
+
+    def evict(self):
+        """
+        remove least recently used entries until total size <= size_max
+
+        Returns
+        -------
+        n_removed: int
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        n_removed = 0
+        for _, size, key in entries:
+            if total <= self._size_max:
+                break
+
+            self.__log.debug('remove %s (%s bytes)', key, size)
+            self.remove(key)
+            total -= size
+            n_removed += 1
+
+        return n_removed
+
+    def clear(self):
+        """
+        remove all entries
+        """
+        for _, _, key in self.entries():
+            self.remove(key)
@@ -0,0 +1,159 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Piano roll: (time x note) matrix
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import numpy as np
+
+
+class PianoRoll:
+    """
+    Piano roll
+
+    イベント・グループ(同時刻のイベント)毎の行と、note毎の列からなる
+    uint8 の行列で、各時刻の各noteの状態を保持する。
+    行列は NumPy で一度に作るので、長い曲でもすぐにできる。
+    文字列への変換は、``rows()`` を呼んだときだけ行う。
+
+    Cell value
+    ----------
+    OFF: 0
+        鳴っていない
+    ON: 1
+        鳴っている
+    START + channel: 2 .. 17
+        note on
+    STOP + channel: 18 .. 33
+        note off
+
+    Simple Usage
+    ------------
+    ============================================================
+    parser = Parser()
+    parsed_data = parser.parse(midi_file, note_table=True)
+
+    piano_roll = parser.mk_piano_roll(parsed_data['note_info'])
+
+    for abs_time, row in zip(piano_roll.abs_time, piano_roll.rows()):
+        print('%08.3f|%s|' % (abs_time, row))
+    ============================================================
+
+    Attributes
+    ----------
+    abs_time: np.ndarray of float64
+        time of each row [sec]
+    roll: np.ndarray of uint8
+        (rows x NOTE_N) matrix
+    note_min, note_max: int
+        range of notes in events
+        (note_min > note_max, if no events)
+    """
+    NOTE_N = 128
+    CH_N = 16
+
+    OFF = 0
+    ON = 1
+    START = 2
+    STOP = START + CH_N
+
+    CHR_ON = '|'
+    CHR_OFF = ' '
+
+    CHR_START = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    CHR_STOP = 'abcdefghijklmnopqrstuvwxyz'
+
+    def __init__(self, abs_time, roll, note_min, note_max):
+        """ Constructor
+
+        Parameters
+        ----------
+        abs_time: array like of float
+        roll: np.ndarray of uint8
+        note_min, note_max: int
+        """
+        self.abs_time = np.asarray(abs_time, dtype=np.float64)
+        self.roll = roll
+        self.note_min = note_min
+        self.note_max = note_max
+
+    @classmethod
+    def from_events(cls, ev):
+        """
+        Parameters
+        ----------
+        ev: np.ndarray of Parser.EVENT_DTYPE
+            sorted and grouped events (see ``Parser.mk_event_array()``)
+
+        Returns
+        -------
+        piano_roll: PianoRoll
+        """
+        group = ev['group']
+        note = ev['note'].astype(np.intp)
+        is_on = ev['velocity'] > 0
+
+        n_rows = int(group[-1]) + 1 if ev.size > 0 else 0
+
+        # number of sounding notes before each row
+        delta = np.zeros((n_rows + 1, cls.NOTE_N), dtype=np.int32)
+        np.add.at(delta, (group + 1, note), np.where(is_on, 1, -1))
+        on_count = np.cumsum(delta, axis=0)[:-1]
+
+        roll = (on_count > 0).astype(np.uint8)
+        roll[group, note] = np.where(is_on, cls.START, cls.STOP) + ev[
+            'channel']
+
+        abs_time = np.empty(n_rows, dtype=np.float64)
+        abs_time[group] = ev['abs_time']
+
+        if ev.size > 0:
+            note_min, note_max = int(note.min()), int(note.max())
+        else:
+            note_min, note_max = cls.NOTE_N - 1, 0
+
+        return cls(abs_time, roll, note_min, note_max)
+
+    @classmethod
+    def chr_table(cls):
+        """
+        Returns
+        -------
+        table: np.ndarray of uint8
+            cell value -> ASCII code
+        """
+        chrs = (cls.CHR_OFF + cls.CHR_ON +
+                cls.CHR_START[:cls.CH_N] + cls.CHR_STOP[:cls.CH_N])
+        return np.frombuffer(chrs.encode('ascii'), dtype=np.uint8)
+
+    def rows(self, start=0, stop=None):
+        """
+        Parameters
+        ----------
+        start, stop: int
+            range of rows
+
+        Returns
+        -------
+        rows: list of str
+            characters of note_min .. note_max in each row
+        """
+        if self.note_min > self.note_max:
+            return [''] * len(self.abs_time[start:stop])
+
+        chrs = self.chr_table()[
+            self.roll[start:stop, self.note_min:self.note_max + 1]]
+        width = chrs.shape[1]
+
+        text = chrs.tobytes().decode('ascii')
+        return [text[i:i + width] for i in range(0, len(text), width)]
+
+    def __len__(self):
+        return len(self.abs_time)
+
+    def __str__(self):
+        return 'PianoRoll(rows=%s, note_min=%s, note_max=%s)' % (
+            len(self), self.note_min, self.note_max)
@@ -0,0 +1,139 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Playback metrics
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import json
+import numpy as np
+
+
+class PlayMetrics:
+    """
+    Playback metrics
+
+    ``Player(metrics=PlayMetrics())`` とすると、再生中の
+    各種の時間 [sec] を記録する。
+    再生後に、``summary()`` でパーセンタイルを求めたり、
+    ``dump()`` で JSON に書き出したりできる。
+
+    Metrics
+    -------
+    LATENESS: 'lateness'
+        note毎の、予定時刻からの発音の遅れ
+    WAIT: 'wait'
+        同時刻の note のグループ毎の、発音時刻までの待ち時間
+    MAKE_SOUND: 'make_sound'
+        音(backend の sound object)毎の、作成にかかった時間
+
+    Simple Usage
+    ------------
+    ============================================================
+    metrics = PlayMetrics()
+    player = Player(metrics=metrics)
+    player.play(parsed_data)
+
+    print(metrics.summary())
+    metrics.dump('metrics.json')
+    ============================================================
+    """
+    LATENESS = 'lateness'
+    WAIT = 'wait'
+    MAKE_SOUND = 'make_sound'
+
+    NAMES = (LATENESS, WAIT, MAKE_SOUND)
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self):
+        """ Constructor """
+        self._data = {name: [] for name in self.NAMES}
+
+    def record(self, name, value):
+        """
+        Parameters
+        ----------
+        name: str
+            one of ``NAMES``
+        value: float
+            [sec]
+        """
+        self._data[name].append(value)
+
+    def values(self, name):
+        """
+        Returns
+        -------
+        values: np.ndarray of float64
+        """
+        return np.array(self._data[name], dtype=np.float64)
+
+    def summary(self):
+        """
+        Returns
+        -------
+        summary: dict
+            {name: {'n': int, 'p50': float, 'p95': float, 'p99': float,
+                    'max': float}, ..}
+            (None for no data)
+        """
+        summary = {}
+        for name in self.NAMES:
+            val = self.values(name)
+
+            if val.size == 0:
+                summary[name] = None
+                continue
+
+            ent = {'n': int(val.size)}
+            for pct, v in zip(self.PERCENTILES,
+                              np.percentile(val, self.PERCENTILES)):
+                ent['p%d' % (pct)] = float(v)
+            ent['max'] = float(val.max())
+
+            summary[name] = ent
+
+        return summary
+
+    def dump(self, outfile, raw=False):
+        """
+        write summary as JSON
+
+        Parameters
+        ----------
+        outfile: str or file like object
+        raw: bool
+            include all values
+        """
+        out = {'summary': self.summary()}
+        if raw:
+            out['raw'] = {name: list(v) for name, v in self._data.items()}
+
+        if isinstance(outfile, str):
+            with open(outfile, 'w') as f:
+                json.dump(out, f, indent=2)
+        else:
+            json.dump(out, outfile, indent=2)
+
+    def clear(self):
+        """
+        clear all values
+        """
+        for values in self._data.values():
+            values.clear()
+
+    def __str__(self):
+        lines = []
+        for name, ent in self.summary().items():
+            if ent is None:
+                lines.append('%-10s: no data' % (name))
+                continue
+
+            lines.append('%-10s: n=%d, %s' % (name, ent['n'], ', '.join(
+                '%s=%.3fms' % (k, v * 1e3) for k, v in ent.items()
+                if k != 'n')))
+
+        return '\n'.join(lines)
@@ -0,0 +1,313 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Sample bank: cache of sound data
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .wav_utils import Wav
+from .midi_utils import note2freq, FREQ_TABLE
+from .my_logger import get_logger
+
+
+class SampleBank:
+    """
+    Sample bank
+
+    (rate, note, key_sec, fade_in, fade_out) をキーにして、
+    ``Wav.synth()`` で作った音源データ(int16)を保持する。
+    ``freq_table`` (``mk_freq_table()``)を指定すると、その音律で音を作る
+    (キーに周波数が加わる)。
+
+    * メモリ上のキャッシュは、合計サイズが ``size_max`` を超えたら、
+      最後に使われたのが古いものから捨てる(LRU)。
+    * ``cache_dir`` を指定すると、``<key>.npy`` として保存し、
+      次回からは memory-map して読み込む。
+      ディレクトリの合計サイズが ``disk_size_max`` を超えたら、
+      最後に使われた時刻が古いものから削除する。
+
+    ``SampleBank.shared()`` は、プロセス内で共有されるインスタンス。
+    ``Player`` などは、デフォルトでこれを使うので、
+    2回目以降の ``play()`` や、別の ``Player`` では、音源を作り直さない。
+
+    Simple Usage
+    ------------
+    ============================================================
+    bank = SampleBank.shared()
+
+    wav = bank.get(rate, note, key_sec)
+    wavs = bank.get_many(rate, [(note, key_sec), ..])
+    ============================================================
+    """
+    DEF_SIZE_MAX = 64 * 1024 * 1024  # bytes
+    DEF_DISK_SIZE_MAX = 256 * 1024 * 1024  # bytes
+
+    SUFFIX = '.npy'
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 size_max=DEF_SIZE_MAX, cache_dir=None,
+                 disk_size_max=DEF_DISK_SIZE_MAX, freq_table=None,
+                 debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        size_max: int
+            max total size of sound data in memory [bytes]
+        cache_dir: str or None
+            directory to save sound data (None: memory only)
+        disk_size_max: int
+            max total size of files in ``cache_dir`` [bytes]
+        freq_table: np.ndarray or None
+            see ``mk_freq_table()`` (None: ``FREQ_TABLE``)
+        """
+        self._dbg = debug
+        self.__log = get_logger(__class__.__name__, self._dbg)
+        self.__log.debug('size_max=%s, cache_dir=%s, disk_size_max=%s',
+                         size_max, cache_dir, disk_size_max)
+
+        self._size_max = size_max
+        self._cache_dir = cache_dir
+        self._disk_size_max = disk_size_max
+
+        self._freq_table = None
+        if freq_table is not None and not np.array_equal(freq_table,
+                                                         FREQ_TABLE):
+            self._freq_table = np.asarray(freq_table, dtype=np.float64)
+
+        self._wav = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        if self._cache_dir:
+            os.makedirs(self._cache_dir, exist_ok=True)
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns
+        -------
+        bank: SampleBank
+            process-wide instance
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+
+            return cls._shared
+
+    def mk_key(self, rate, note, sec):
+        """
+        Returns
+        -------
+        key: tuple
+            (rate, note, sec, fade_in, fade_out)
+            (rate, note, sec, fade_in, fade_out, freq): with ``freq_table``
+        """
+        key = (rate, note, sec, Wav.FADE_IN, Wav.FADE_OUT)
+        if self._freq_table is None:
+            return key
+
+        return key + (round(float(self._freq_table[note]), 4),)
+
+    def note2freq(self, note):
+        """
+        Parameters
+        ----------
+        note: int or array like of int
+
+        Returns
+        -------
+        freq: float or np.ndarray of float64
+            in the tuning of the bank
+        """
+        return note2freq(note, self._freq_table)
+
+    def path(self, key):
+        """
+        Returns
+        -------
+        path: str
+        """
+        return os.path.join(self._cache_dir,
+                            '_'.join([str(k) for k in key]) + self.SUFFIX)
+
+    def get(self, rate, note, sec):
+        """
+        Parameters
+        ----------
+        rate: int
+        note: int
+        sec: float
+
+        Returns
+        -------
+        wav: np.ndarray of int16
+        """
+        return self.get_many(rate, [(note, sec)])[(note, sec)]
+
+    def get_many(self, rate, keys, workers=None):
+        """
+        Sounds which are not in the bank are made at once
+        for each length (``Wav.synth()``), on a thread pool
+        if ``workers`` > 1.
+
+        Parameters
+        ----------
+        rate: int
+        keys: iterable of tuple
+            (note_num, key_sec)
+        workers: int or None
+
+        Returns
+        -------
+        wavs: {(note_num, key_sec): np.ndarray of int16}
+        """
+        wavs = {}
+        group = {}
+        for key in dict.fromkeys(keys):
+            wav = self.lookup(self.mk_key(rate, *key))
+            if wav is None:
+                group.setdefault(key[1], []).append(key[0])
+            else:
+                wavs[key] = wav
+
+        def synth(sec):
+            notes = group[sec]
+            freq = self.note2freq(np.array(notes, dtype=np.int64))
+            return (sec, notes, Wav.synth(freq, sec, rate))
+
+        if workers is not None and workers > 1 and len(group) > 1:
+            with ThreadPoolExecutor(workers) as executor:
+                results = list(executor.map(synth, group))
+        else:
+            results = map(synth, group)
+
+        for sec, notes, wav in results:
+            for note, wav1 in zip(notes, wav):
+                self.store(self.mk_key(rate, note, sec), wav1)
+                wavs[(note, sec)] = wav1
+
+        if group and self._cache_dir:
+            self.evict()
+
+        return wavs
+
+    def lookup(self, key):
+        """
+        Parameters
+        ----------
+        key: tuple
+            see ``mk_key()``
+
+        Returns
+        -------
+        wav: np.ndarray of int16 or None
+        """
+        with self._lock:
+            wav = self._wav.get(key)
+            if wav is not None:
+                self._wav.move_to_end(key)
+                return wav
+
+        if not self._cache_dir:
+            return None
+
+        path = self.path(key)
+        try:
+            wav = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        # update last used time for LRU
+        os.utime(path)
+
+        self.store(key, wav, save=False)
+        return wav
+
+    def store(self, key, wav, save=True):
+        """
+        Parameters
+        ----------
+        key: tuple
+            see ``mk_key()``
+        wav: np.ndarray of int16
+        save: bool
+            save to ``cache_dir``
+        """
+        with self._lock:
+            if key in self._wav:
+                self._size -= self._wav[key].nbytes
+
+            self._wav[key] = wav
+            self._size += wav.nbytes
+
+            while self._size > self._size_max and len(self._wav) > 1:
+                _, old = self._wav.popitem(last=False)
+                self._size -= old.nbytes
+
+        if save and self._cache_dir:
+            path = self.path(key)
+            tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(),
+                                         threading.get_ident())
+            with open(tmp_path, 'wb') as f:
+                np.save(f, wav)
+            os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        remove least recently used files
+        until total size <= disk_size_max
+
+        Returns
+        -------
+        n_removed: int
+        """
+        entries = []
+        with os.scandir(self._cache_dir) as it:
+            for ent in it:
+                if not ent.name.endswith(self.SUFFIX):
+                    continue
+                try:
+                    stat = ent.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, ent.path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+
+        n_removed = 0
+        for _, size, path in entries:
+            if total <= self._disk_size_max:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            n_removed += 1
+
+        return n_removed
+
+    def clear(self):
+        """
+        clear sound data in memory
+        """
+        with self._lock:
+            self._wav.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._wav)
@@ -0,0 +1,348 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Standard MIDI File (SMF) reader
+
+``mido`` を使わずに、SMFファイルを直接デコードする。
+``Parser`` が必要とするイベント(note on/off, set_tempo, end_of_track)
+だけを取り出す。
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import heapq
+import mmap
+from operator import itemgetter
+from .my_logger import get_logger
+
+
+class SmfReader:
+    """
+    Standard MIDI File reader
+
+    ファイルを ``mmap`` し、``memoryview`` 上で、
+    可変長数値(variable-length quantity)とランニングステータスを
+    直接解析する。
+    全トラックのイベントは、heap を使って k-way merge する。
+
+    Simple Usage
+    ------------
+    ============================================================
+    with SmfReader(midi_file) as reader:
+        for ev in reader.events():
+            tick, ev_type, channel, note, value = ev
+    ============================================================
+
+    Event
+    -----
+    (tick, ev_type, channel, note, value)
+
+    tick: int
+        absolute time [tick]
+    ev_type: str
+        'note_on', 'note_off', 'set_tempo' or 'end_of_track'
+    channel, note: int or None
+    value: int or None
+        velocity (note_on/note_off) or tempo (set_tempo) [usec/beat]
+
+    Attributes
+    ----------
+    type: int
+        SMF format type: 0, 1 or 2
+    ticks_per_beat: int
+    """
+    NOTE_OFF = 'note_off'
+    NOTE_ON = 'note_on'
+    SET_TEMPO = 'set_tempo'
+    END_OF_TRACK = 'end_of_track'
+
+    # data length of system common messages
+    SYSTEM_DATA_LEN = {0xf1: 1, 0xf2: 2, 0xf3: 1}
+
+    def __init__(self, midi_file, debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        midi_file: str
+            file name of MIDI file
+        """
+        self._dbg = debug
+        self.__log = get_logger(__class__.__name__, self._dbg)
+        self.__log.debug('midi_file=%s', midi_file)
+
+        with open(midi_file, 'rb') as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file can not be mmap'ed
+                self._mmap = None
+
+        self._buf = memoryview(self._mmap if self._mmap else b'')
+        self._end_tick = 0
+        self._channel_seen = bytearray(16)
+
+        self.type, self.ticks_per_beat, self._tracks = self.read_header()
+        self.__log.debug('type=%s, ticks_per_beat=%s, tracks=%s',
+                         self.type, self.ticks_per_beat,
+                         len(self._tracks))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.close()
+
+    def close(self):
+        """
+        release memoryview and mmap
+        """
+        self._buf.release()
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+
+    def read_header(self):
+        """
+        Returns
+        -------
+        (smf_type, ticks_per_beat, tracks): (int, int, list)
+            tracks: list of (start, end) position of track data
+
+        Raises
+        ------
+        EOFError
+            the file ends in the middle of the header or a track chunk
+        """
+        buf = self._buf
+
+        if bytes(buf[0:4]) != b'MThd':
+            raise ValueError('no MThd header at start of file')
+
+        if len(buf) < 14:
+            raise EOFError('unexpected end of data at offset %d' % (len(buf)))
+
+        size = int.from_bytes(buf[4:8], 'big')
+        smf_type = int.from_bytes(buf[8:10], 'big')
+        n_tracks = int.from_bytes(buf[10:12], 'big')
+        ticks_per_beat = int.from_bytes(buf[12:14], 'big')
+
+        if ticks_per_beat & 0x8000:
+            raise ValueError('SMPTE time division is not supported')
+
+        tracks = []
+        pos = 8 + size
+        for track_no in range(n_tracks):
+            if pos + 8 > len(buf):
+                raise EOFError('track %d: unexpected end of data at offset %d'
+                               % (track_no, len(buf)))
+
+            if bytes(buf[pos:pos+4]) != b'MTrk':
+                raise ValueError('no MTrk header at start of track')
+
+            size = int.from_bytes(buf[pos+4:pos+8], 'big')
+            if pos + 8 + size > len(buf):
+                raise EOFError('track %d: unexpected end of data at offset %d'
+                               % (track_no, len(buf)))
+
+            tracks.append((pos + 8, pos + 8 + size))
+            pos += 8 + size
+
+        return (smf_type, ticks_per_beat, tracks)
+
+    @staticmethod
+    def read_vlq(buf, pos, end=None):
+        """
+        read variable-length quantity
+
+        Parameters
+        ----------
+        buf: bytes like
+        pos: int
+        end: int or None
+            end position of the data (None: end of ``buf``)
+
+        Returns
+        -------
+        (value, pos): (int, int)
+            value and next position
+
+        Raises
+        ------
+        EOFError
+            the data ends in the middle of the value
+        """
+        if end is None:
+            end = len(buf)
+
+        value = 0
+        while pos < end:
+            byte = buf[pos]
+            pos += 1
+            value = (value << 7) | (byte & 0x7f)
+            if byte < 0x80:
+                return (value, pos)
+
+        raise EOFError('unexpected end of data at offset %d' % (pos))
+
+    def track_events(self, track_no, channel=None):
+        """
+        generate events of one track
+
+        ``end_of_track`` of each track is not generated
+        (see ``events()``).
+
+        Parameters
+        ----------
+        track_no: int
+        channel: list of int or None
+            selected channel (None: all channels)
+
+        Returns
+        -------
+        generator of event tuple
+
+        Raises
+        ------
+        EOFError
+            the track data ends in the middle of an event
+        """
+        try:
+            yield from self._track_events(track_no, channel)
+        except EOFError as ex:
+            raise EOFError('track %d: %s' % (track_no, ex)) from None
+
+    def _track_events(self, track_no, channel):
+        """
+        body of ``track_events()``
+        """
+        buf = self._buf
+        read_vlq = self.read_vlq
+        seen = self._channel_seen
+        pos, end = self._tracks[track_no]
+
+        selected = None
+        if channel:
+            selected = bytearray(16)
+            for ch in channel:
+                selected[ch] = 1
+
+        tick = 0
+        status = None
+
+        while pos < end:
+            delta, pos = read_vlq(buf, pos, end)
+            tick += delta
+
+            if pos >= end:
+                raise EOFError('unexpected end of data at offset %d' % (pos))
+
+            byte = buf[pos]
+            if byte >= 0x80:
+                pos += 1
+                if byte < 0xf0:
+                    status = byte
+                elif byte in (0xf0, 0xf7):
+                    # sysex cancels running status
+                    status = None
+            else:
+                # running status
+                if status is None:
+                    raise ValueError('running status without last status')
+                byte = status
+
+            if byte == 0xff:
+                if pos >= end:
+                    raise EOFError(
+                        'unexpected end of data at offset %d' % (pos))
+
+                meta_type = buf[pos]
+                length, pos = read_vlq(buf, pos + 1, end)
+                if pos + length > end:
+                    raise EOFError(
+                        'unexpected end of data at offset %d' % (end))
+
+                if meta_type == 0x51 and length == 3:
+                    tempo = int.from_bytes(buf[pos:pos+3], 'big')
+                    yield (tick, self.SET_TEMPO, None, None, tempo)
+
+                pos += length
+                continue
+
+            if byte in (0xf0, 0xf7):
+                length, pos = read_vlq(buf, pos, end)
+                pos += length
+                continue
+
+            if byte >= 0xf0:
+                pos += self.SYSTEM_DATA_LEN.get(byte, 0)
+                continue
+
+            kind = byte & 0xf0
+
+            if kind in (0xc0, 0xd0):
+                pos += 1
+                continue
+
+            if kind in (0x90, 0x80):
+                if pos + 2 > end:
+                    raise EOFError(
+                        'unexpected end of data at offset %d' % (end))
+
+                ch = byte & 0x0f
+                seen[ch] = 1
+
+                if selected is None or selected[ch]:
+                    if kind == 0x90:
+                        yield (tick, self.NOTE_ON, ch, buf[pos], buf[pos+1])
+                    else:
+                        yield (tick, self.NOTE_OFF, ch, buf[pos], buf[pos+1])
+
+            pos += 2
+
+        if pos > end:
+            raise EOFError('unexpected end of data at offset %d' % (end))
+
+        self._end_tick = max(self._end_tick, tick)
+
+    def events(self, channel=None):
+        """
+        generate events of all tracks in time order
+
+        Events at the same tick are ordered by track number and
+        by position in the track (same as ``mido.merge_tracks()``).
+        One ``end_of_track`` event is generated at the end.
+
+        Parameters
+        ----------
+        channel: list of int or None
+            selected channel (None: all channels)
+            note events of the other channels are skipped while decoding
+            (but counted in ``channel_set()``)
+
+        Returns
+        -------
+        generator of event tuple
+        """
+        self._end_tick = 0
+        self._channel_seen = bytearray(16)
+
+        tracks = [self.track_events(i, channel)
+                  for i in range(len(self._tracks))]
+
+        yield from heapq.merge(*tracks, key=itemgetter(0))
+
+        yield (self._end_tick, self.END_OF_TRACK, None, None, None)
+
+    def channel_set(self):
+        """
+        Returns
+        -------
+        channel_set: set of int
+            channels of note events generated by ``events()``,
+            including skipped ones (complete after ``events()``
+            is exhausted)
+        """
+        return {ch for ch, seen in enumerate(self._channel_seen) if seen}
@@ -0,0 +1,247 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Callback driven MIDI player on ``sounddevice``
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import threading
+import numpy as np
+from .sample_bank import SampleBank
+from .note_table import as_note_table
+from .midi_player import Player
+from .my_logger import get_logger
+
+
+class StreamPlayer:
+    """
+    Callback driven MIDI player
+
+    ``sounddevice`` (PortAudio) の出力ストリームのコールバックの中で、
+    鳴っている音(voice)を ``blocksize`` サンプル毎のブロックに
+    足し込んで出力する。
+    各 note の開始位置はサンプル単位で決まるので、``time.sleep()`` の
+    ゆらぎが無く、遅延はブロックサイズ以下になる。
+    pygame.mixer のチャンネル数の制限も無い。
+
+    音と音量は ``Player`` と同じ。
+
+    ``sounddevice`` は、``play()`` を呼んだときに import する
+    (PortAudio が無い環境でも、このモジュールは import できる)。
+
+    Simple Usage
+    ------------
+    ============================================================
+    parsed_data = Parser().parse(midi_file, note_table=True)
+
+    player = StreamPlayer()
+    player.play(parsed_data)
+    ============================================================
+    """
+    DEF_RATE = Player.DEF_RATE
+    DEF_BLOCKSIZE = 512  # samples
+
+    AMP_MAX = 32768
+
+    def __init__(self, rate=DEF_RATE, blocksize=DEF_BLOCKSIZE,
+                 sample_bank=None, debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        rate: int
+            sampling rate [Hz]
+        blocksize: int
+            number of samples in one callback
+        sample_bank: SampleBank or None
+            None: ``SampleBank.shared()``
+        """
+        self._dbg = debug
+        self.__log = get_logger(__class__.__name__, self._dbg)
+        self.__log.debug('rate=%s, blocksize=%s', rate, blocksize)
+
+        self._rate = rate
+        self._blocksize = blocksize
+        self._bank = sample_bank
+        if self._bank is None:
+            self._bank = SampleBank.shared()
+
+        self._snd = {}
+
+        self._start = []   # start position of notes [sample]
+        self._wav = []     # sound of notes
+        self._vol = []     # volume of notes
+        self._next = 0     # index of next note
+        self._voices = []  # [[wav, pos in wav, vol], ..]
+        self._pos = 0      # current position [sample]
+
+    def mk_sound(self, key):
+        """
+        Parameters
+        ----------
+        key: tuple
+            (note_num, key_sec)
+
+        Returns
+        -------
+        wav: np.ndarray of float32
+            -1.0 .. 1.0
+        """
+        wav = self._snd.get(key)
+
+        if wav is None:
+            wav = self._bank.get(self._rate, key[0], key[1])
+            wav = wav.astype(np.float32) / self.AMP_MAX
+            self._snd[key] = wav
+
+        return wav
+
+    def load(self, parsed_midi, pos_sec=0.0,
+             sec_min=Player.SEC_MIN, sec_max=Player.SEC_MAX):
+        """
+        prepare notes and sounds
+
+        Parameters
+        ----------
+        parsed_midi: dict
+            'note_info': NoteTable or list of NoteInfo
+        pos_sec: float
+            seek position in sec
+        sec_min, sec_max: float
+            min/max sound length
+        """
+        table = as_note_table(parsed_midi['note_info'])
+
+        # notes sounding at pos_sec start in the middle of their sounds
+        index = table.interval_index()
+        idx = index.at(pos_sec)
+        idx = np.concatenate([idx[table.abs_time[idx] < pos_sec],
+                              index.seek(pos_sec)])
+        table = table[idx]
+        table = table[table.velocity > 0]
+
+        key_sec = Player.key_sec(table.length(), sec_min, sec_max)
+        keys = list(zip(table.note.tolist(), key_sec.tolist()))
+        self._bank.get_many(self._rate, keys)
+
+        start = table.abs_time - pos_sec
+        if start.size > 0 and start[0] > Player.FIRST_DELAY_MAX:
+            self.__log.warning('delay:%s too long .. fix', start[0])
+            start -= start[0] - Player.FIRST_DELAY_MAX
+
+        start = np.round(start * self._rate).astype(np.int64).tolist()
+        wavs = [self.mk_sound(key) for key in keys]
+        vol = (table.velocity / 128 / 8).tolist()
+
+        # drop sounding notes whose sounds have already ended
+        notes = [(s, w, v) for s, w, v in zip(start, wavs, vol)
+                 if -s < w.size]
+
+        self._start = [s for s, _, _ in notes]
+        self._wav = [w for _, w, _ in notes]
+        self._vol = [v for _, _, v in notes]
+
+        self._next = 0
+        self._voices = []
+        self._pos = 0
+
+        self.__log.debug('notes=%s, sounds=%s',
+                         len(self._start), len(self._snd))
+
+    def finished(self):
+        """
+        Returns
+        -------
+        finished: bool
+            all notes have been mixed
+        """
+        return self._next >= len(self._start) and not self._voices
+
+    def mix_block(self, frames):
+        """
+        mix active voices into one block
+
+        Parameters
+        ----------
+        frames: int
+            number of samples
+
+        Returns
+        -------
+        block: np.ndarray of float32
+        """
+        block = np.zeros(frames, dtype=np.float32)
+        pos = self._pos
+        end = pos + frames
+
+        # start new voices in this block
+        while self._next < len(self._start) and self._start[self._next] < end:
+            i = self._next
+            self._voices.append([self._wav[i], pos - self._start[i],
+                                 self._vol[i]])
+            self._next += 1
+
+        voices = []
+        for voice in self._voices:
+            wav, w_pos, vol = voice
+
+            # w_pos < 0: the voice starts in the middle of the block
+            b_pos = max(-w_pos, 0)
+            w_pos = max(w_pos, 0)
+            n = min(frames - b_pos, wav.size - w_pos)
+            if n <= 0:
+                continue
+
+            block[b_pos:b_pos + n] += vol * wav[w_pos:w_pos + n]
+
+            voice[1] = w_pos + n
+            if voice[1] < wav.size:
+                voices.append(voice)
+
+        self._voices = voices
+        self._pos = end
+
+        np.clip(block, -1.0, 1.0, out=block)
+        return block
+
+    def play(self, parsed_midi, pos_sec=0.0,
+             sec_min=Player.SEC_MIN, sec_max=Player.SEC_MAX):
+        """
+        play parsed midi data (blocking)
+
+        Parameters
+        ----------
+        parsed_midi: dict
+            'note_info': NoteTable or list of NoteInfo
+        pos_sec: float
+            seek position in sec
+        sec_min, sec_max: float
+            min/max sound length
+        """
+        # pylint: disable=import-outside-toplevel
+        import sounddevice as sd  # pylint: disable=import-error
+
+        self.load(parsed_midi, pos_sec, sec_min, sec_max)
+
+        done = threading.Event()
+
+        def callback(outdata, frames, time_info, status):
+            # pylint: disable=unused-argument
+            if status:
+                self.__log.warning('status=%s', status)
+
+            outdata[:, 0] = self.mix_block(frames)
+
+            if self.finished():
+                raise sd.CallbackStop
+
+        with sd.OutputStream(samplerate=self._rate,
+                             blocksize=self._blocksize,
+                             channels=1, dtype='float32',
+                             callback=callback,
+                             finished_callback=done.set):
+            done.wait()
+
+        print('end music')
@@ -0,0 +1,186 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Tempo map: tick <-> sec conversion
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import numpy as np
+import mido  # pylint: disable=import-error
+
+
+class TempoMap:
+    """
+    Tempo map
+
+    テンポ変更点毎に、開始tick、テンポ、開始時刻(sec)の累積テーブルを持ち、
+    ``np.searchsorted()`` で区間を求めて、tick と sec を相互に変換する。
+    array をまとめて一度に変換できる。
+
+    最初の set_tempo より前は、デフォルトテンポ(500000 usec/beat)。
+
+    Simple Usage
+    ------------
+    ============================================================
+    tempo_map = TempoMap.from_midi(mido.MidiFile(midi_file))
+
+    sec = tempo_map.tick2sec(ticks)  # array of tick -> array of sec
+    tick = tempo_map.sec2tick(sec)
+    ============================================================
+
+    Attributes
+    ----------
+    ticks_per_beat: int
+    """
+    DEF_TEMPO = 500000  # usec/beat
+
+    def __init__(self, ticks_per_beat, tempo_list=()):
+        """ Constructor
+
+        Parameters
+        ----------
+        ticks_per_beat: int
+        tempo_list: list of (int, int)
+            [(tick, tempo), ..] in tick order
+        """
+        self.ticks_per_beat = ticks_per_beat
+
+        self._tick = [0]
+        self._tempo = [self.DEF_TEMPO]
+        self._sec = [0.0]
+
+        self._table = None
+
+        for tick, tempo in tempo_list:
+            self.append(tick, tempo)
+
+    @classmethod
+    def from_midi(cls, midi_obj):
+        """
+        Parameters
+        ----------
+        midi_obj: mido.MidiFile
+
+        Returns
+        -------
+        tempo_map: TempoMap
+        """
+        tempo_list = []
+        for track in midi_obj.tracks:
+            tick = 0
+            for msg in track:
+                tick += msg.time
+                if msg.type == 'set_tempo':
+                    tempo_list.append((tick, msg.tempo))
+
+        # stable sort: same order as ``mido.merge_tracks()``
+        tempo_list.sort(key=lambda x: x[0])
+
+        return cls(midi_obj.ticks_per_beat, tempo_list)
+
+    def append(self, tick, tempo):
+        """
+        append tempo change
+
+        Parameters
+        ----------
+        tick: int
+            >= tick of the last tempo change
+        tempo: int
+            usec/beat
+        """
+        if tick < self._tick[-1]:
+            raise ValueError('tick %s < last tick %s' % (
+                tick, self._tick[-1]))
+
+        if tick == self._tick[-1]:
+            # override tempo change at the same tick
+            self._tempo[-1] = tempo
+        else:
+            self._sec.append(self._sec[-1] + mido.tick2second(
+                tick - self._tick[-1], self.ticks_per_beat,
+                self._tempo[-1]))
+            self._tick.append(tick)
+            self._tempo.append(tempo)
+
+        self._table = None
+
+    def table(self):
+        """
+        Returns
+        -------
+        (tick, sec, sec_per_tick): tuple of np.ndarray
+            cumulative table at each tempo change
+        """
+        if self._table is None:
+            self._table = (
+                np.array(self._tick, dtype=np.int64),
+                np.array(self._sec, dtype=np.float64),
+                np.array(self._tempo, dtype=np.float64)
+                * 1e-6 / self.ticks_per_beat
+            )
+
+        return self._table
+
+    def tick2sec(self, tick):
+        """
+        Parameters
+        ----------
+        tick: int or array like of int
+
+        Returns
+        -------
+        sec: float or np.ndarray of float64
+        """
+        t_tick, t_sec, t_spt = self.table()
+
+        tick = np.asarray(tick)
+        idx = np.searchsorted(t_tick, tick, side='right') - 1
+        idx = np.maximum(idx, 0)
+
+        sec = t_sec[idx] + (tick - t_tick[idx]) * t_spt[idx]
+
+        if sec.ndim == 0:
+            return float(sec)
+        return sec
+
+    def sec2tick(self, sec):
+        """
+        Parameters
+        ----------
+        sec: float or array like of float
+
+        Returns
+        -------
+        tick: float or np.ndarray of float64
+            (not rounded)
+        """
+        t_tick, t_sec, t_spt = self.table()
+
+        sec = np.asarray(sec, dtype=np.float64)
+        idx = np.searchsorted(t_sec, sec, side='right') - 1
+        idx = np.maximum(idx, 0)
+
+        tick = t_tick[idx] + (sec - t_sec[idx]) / t_spt[idx]
+
+        if tick.ndim == 0:
+            return float(tick)
+        return tick
+
+    def tempo_list(self):
+        """
+        Returns
+        -------
+        tempo_list: list of (int, int)
+            [(tick, tempo), ..]
+        """
+        return list(zip(self._tick, self._tempo))
+
+    def __len__(self):
+        return len(self._tick)
+
+    def __str__(self):
+        return 'TempoMap(ticks_per_beat=%s, %s)' % (
+            self.ticks_per_beat, self.tempo_list())
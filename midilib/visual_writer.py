@@ -0,0 +1,159 @@
+#
+# (c) 2021 Yoichi Tanibayashi
+#
+"""
+Buffered writer of visual (paper tape) text
+"""
+__author__ = 'Yoichi Tanibayashi'
+__date__ = '2021/01'
+
+import sys
+from .piano_roll import PianoRoll
+from .my_logger import get_logger
+
+
+class VisualWriter:
+    """
+    Buffered writer of visual text
+
+    行を文字列のリストにためて、``chunk_rows`` 行毎に
+    連結して、まとめて ``write()`` する。
+    1文字・1行毎に ``print()`` するより、システムコールと
+    フォーマットの回数が少ないので、パイプやファイルへの
+    出力が速い。
+
+    Simple Usage
+    ------------
+    ============================================================
+    parser = Parser()
+    parsed_data = parser.parse(midi_file, note_table=True)
+    piano_roll = parser.mk_piano_roll(parsed_data['note_info'])
+
+    with open(out_file, 'w') as f:
+        with VisualWriter(f) as writer:
+            writer.write_piano_roll(piano_roll,
+                                    parsed_data['channel_set'])
+    ============================================================
+    """
+    DEF_CHUNK_ROWS = 4096
+
+    TIME_FMT = '%08.3f'
+    TIME_WIDTH = 8
+
+    def __init__(self, out=None, chunk_rows=DEF_CHUNK_ROWS, debug=False):
+        """ Constructor
+
+        Parameters
+        ----------
+        out: file like object
+            default: sys.stdout
+        chunk_rows: int
+            number of lines in one ``write()``
+        """
+        self._dbg = debug
+        self.__log = get_logger(__class__.__name__, self._dbg)
+        self.__log.debug('chunk_rows=%s', chunk_rows)
+
+        self._out = out if out is not None else sys.stdout
+        self._chunk_rows = max(chunk_rows, 1)
+        self._buf = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.flush()
+
+    def write_lines(self, lines):
+        """
+        Parameters
+        ----------
+        lines: iterable of str
+            lines without newline
+        """
+        buf = self._buf
+        for line in lines:
+            buf.append(line)
+            if len(buf) >= self._chunk_rows:
+                self.flush()
+                buf = self._buf
+
+    def flush(self):
+        """
+        write buffered lines
+        """
+        if self._buf:
+            self._buf.append('')
+            self._out.write('\n'.join(self._buf))
+            self._buf = []
+
+        self._out.flush()
+
+    @staticmethod
+    def note_header(note_min, note_max):
+        """
+        Parameters
+        ----------
+        note_min, note_max: int
+
+        Returns
+        -------
+        lines: list of str
+            3 lines: hundreds, tens and ones digits of note numbers
+        """
+        numbers = ['%03d' % (n) for n in range(note_min, note_max + 1)]
+
+        return [''.join(num[i] for num in numbers) for i in range(3)]
+
+    def write_rows(self, abs_time, rows):
+        """
+        Parameters
+        ----------
+        abs_time: iterable of float
+        rows: iterable of str
+        """
+        fmt = self.TIME_FMT + '|%s|'
+
+        self.write_lines(fmt % (t, r) for t, r in zip(abs_time, rows))
+
+    def write_visual(self,  # pylint: disable=too-many-arguments
+                     note_min, note_max, abs_time, rows, channel_set):
+        """
+        write header, rows, footer and channel legend
+        (format of ``Parser.print_visual()``)
+
+        Parameters
+        ----------
+        note_min, note_max: int
+        abs_time: iterable of float
+        rows: iterable of str
+        channel_set: set of int
+        """
+        margin = ' ' * self.TIME_WIDTH
+        header = ['%s|%s|' % (margin, h)
+                  for h in self.note_header(note_min, note_max)]
+        line = '-' * self.TIME_WIDTH + '+' + '-' * max(
+            note_max - note_min + 1, 0) + '+'
+
+        self.write_lines(header + [line])
+        self.write_rows(abs_time, rows)
+        self.write_lines([line] + header + [''])
+
+        self.write_lines('CH(%2d): %s--%s' % (
+            c, PianoRoll.CHR_START[c], PianoRoll.CHR_STOP[c])
+                         for c in sorted(channel_set))
+
+    def write_piano_roll(self, piano_roll, channel_set):
+        """
+        Parameters
+        ----------
+        piano_roll: PianoRoll
+        channel_set: set of int
+        """
+        def gen_rows():
+            for start in range(0, len(piano_roll), self._chunk_rows):
+                yield from piano_roll.rows(start, start + self._chunk_rows)
+
+        self.write_visual(piano_roll.note_min, piano_roll.note_max,
+                          piano_roll.abs_time.tolist(), gen_rows(),
+                          channel_set)
@@ -9,13 +9,31 @@ __author__ = 'Yoichi Tanibayashi'
 __date__ = '2020'
 
 import wave
-import array
 import time
 import numpy as np
 import pygame
 from .my_logger import get_logger
 
 
+def write_wav(outfile, wav, rate):
+    """
+    write monaural 16bit wav file
+
+    Parameters
+    ----------
+    outfile: str or file like object
+    wav: array like of int16
+    rate: int
+        sampling rate [Hz]
+    """
+    wav = np.asarray(wav, dtype='<i2')
+
+    with wave.open(outfile, 'wb') as w_write:
+        w_write.setparams((
+            1, 2, rate, len(wav), 'NONE', 'not compressed'))
+        w_write.writeframes(wav.tobytes())
+
+
 class Wav:
     """Wav
 
@@ -30,19 +48,44 @@ class Wav:
     VOL_MIN = 0.0
     DEF_VOL = 0.25
 
-    def __init__(self, freq, sec=DEF_SEC, rate=DEF_RATE, debug=False):
+    FADE_IN = 0.01  # ratio of fade-in length
+    FADE_OUT = 0.4  # ratio of fade-out length
+
+    AMPLITUDE = 32767
+
+    MODE_SIN = 'sin'
+    MODE_TABLE = 'table'
+    MODES = (MODE_SIN, MODE_TABLE)
+
+    TABLE_BITS = 14  # wavetable size: 2 ** TABLE_BITS
+    PHASE_BITS = 32
+
+    _wavetable = {}
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 freq, sec=DEF_SEC, rate=DEF_RATE, debug=False, *,
+                 mode=MODE_SIN):
         """constructor
 
         Parameters
         ----------
+        mode: str
+            'sin': ``np.sin()`` (default)
+            'table': wavetable (see ``synth_table()``)
         """
         self._dbg = debug
         self.__log = get_logger(__class__.__name__, self._dbg)
-        self.__log.debug('freq,sec,rate=%s', (freq, sec, rate))
+        if self._dbg:
+            self.__log.debug('freq,sec,rate=%s', (freq, sec, rate))
+            self.__log.debug('mode=%s', mode)
+
+        if mode not in self.MODES:
+            raise ValueError('invalid `mode` value: %s' % (mode))
 
         self._freq = freq
         self._sec = sec
         self._rate = rate
+        self._mode = mode
 
         self.wav = self.mk_wav()
 
@@ -52,46 +95,144 @@ class Wav:
         Parameters
         ----------
         """
-        self.__log.debug('')
+        if self._dbg:
+            self.__log.debug('')
+
+        if self._mode == self.MODE_TABLE:
+            return self.synth_table(self._freq, self._sec, self._rate)
+
+        return self.synth(self._freq, self._sec, self._rate)
+
+    @staticmethod
+    def synth(freq,  # pylint: disable=too-many-arguments
+              sec=DEF_SEC, rate=DEF_RATE,
+              fade_in=FADE_IN, fade_out=FADE_OUT):
+        """
+        make sound data of one or more frequencies at once
+
+        Parameters
+        ----------
+        freq: float or array like of float
+        sec: float
+        rate: int
+        fade_in, fade_out: float
+            ratio of fade-in/out length
 
+        Returns
+        -------
+        wav: np.ndarray of int16
+            shape: (samples,) or (len(freq), samples)
+        """
         # サンプリングする位置(秒)のarray
-        sample_sec = np.arange(self._rate * self._sec) / self._rate
+        sample_sec = np.arange(rate * sec) / rate
 
         # -32767 .. 32767 の sin波
-        amplitude = 32767  # 振幅
+        amplitude = Wav.AMPLITUDE  # 振幅
         sin_wave1 = amplitude * np.sin(
-            2 * np.pi * self._freq * sample_sec)
+            2 * np.pi * np.multiply.outer(freq, sample_sec))
 
         # [Important!]
         #   fade-in/outすることで、耳障りなブツブツ音を軽減
         #
         # [TBD]
-        #   前後のフェードする割合は、self._secに応じて片方が
+        #   前後のフェードする割合は、secに応じて片方が
         #   いいかも?
         #
-        fade_len = int(sin_wave1.size * 0.01)
+        n_samples = sample_sec.size
+        fade_len = int(n_samples * fade_in)
         slope = (np.arange(fade_len)) / fade_len
-        sin_wave1[:fade_len] = sin_wave1[:fade_len] * slope
-        fade_len = int(sin_wave1.size * 0.4)
+        sin_wave1[..., :fade_len] = sin_wave1[..., :fade_len] * slope
+        fade_len = int(n_samples * fade_out)
         slope = ((fade_len - 1) - np.arange(fade_len)) / fade_len
-        sin_wave1[-fade_len:] = sin_wave1[-fade_len:] * slope
+        sin_wave1[..., n_samples - fade_len:] = (
+            sin_wave1[..., n_samples - fade_len:] * slope)
 
         # int16に変換
         sin_wave2 = np.array(sin_wave1, dtype=np.int16)
 
         return sin_wave2
 
+    @classmethod
+    def wavetable(cls):
+        """
+        Returns
+        -------
+        table: np.ndarray of int16
+            one cycle of sin wave (2 ** TABLE_BITS samples)
+        """
+        table = cls._wavetable.get(cls.TABLE_BITS)
+
+        if table is None:
+            size = 1 << cls.TABLE_BITS
+            table = np.round(cls.AMPLITUDE * np.sin(
+                2 * np.pi * np.arange(size) / size)).astype(np.int16)
+            cls._wavetable[cls.TABLE_BITS] = table
+
+        return table
+
+    @classmethod
+    def synth_table(cls,  # pylint: disable=too-many-arguments
+                    freq, sec=DEF_SEC, rate=DEF_RATE,
+                    fade_in=FADE_IN, fade_out=FADE_OUT, dtype=np.int16):
+        """
+        make sound data by wavetable
+
+        32bit の固定小数点の位相を、freq に応じた増分ずつ進め、
+        上位 ``TABLE_BITS`` ビットで wavetable を引く。
+        float64 の中間データを作らないので、
+        ``synth()`` より速く、メモリも少ない。
+
+        Parameters
+        ----------
+        freq: float or array like of float
+        sec: float
+        rate: int
+        fade_in, fade_out: float
+            ratio of fade-in/out length
+        dtype: np.dtype
+            np.int16 (default) or np.float32 (same amplitude)
+
+        Returns
+        -------
+        wav: np.ndarray of dtype
+            shape: (samples,) or (len(freq), samples)
+        """
+        n_samples = int(np.ceil(rate * sec))
+
+        phase_inc = np.round(
+            np.asarray(freq, dtype=np.float64) / rate * (1 << cls.PHASE_BITS)
+        ).astype(np.uint64).astype(np.uint32)
+
+        # phase: wraps around at 2 ** PHASE_BITS
+        phase = np.multiply.outer(phase_inc,
+                                  np.arange(n_samples, dtype=np.uint32))
+        phase >>= cls.PHASE_BITS - cls.TABLE_BITS
+
+        wav = cls.wavetable().take(phase)
+        del phase
+
+        # fade-in/out (integer arithmetic)
+        fade_len = int(n_samples * fade_in)
+        if fade_len > 0:
+            slope = np.arange(fade_len, dtype=np.int64)
+            wav[..., :fade_len] = (
+                wav[..., :fade_len] * slope // fade_len)
+
+        fade_len = int(n_samples * fade_out)
+        if fade_len > 0:
+            slope = np.arange(fade_len - 1, -1, -1, dtype=np.int64)
+            wav[..., n_samples - fade_len:] = (
+                wav[..., n_samples - fade_len:] * slope // fade_len)
+
+        return wav.astype(dtype, copy=False)
+
     def save(self, outfile):
         """
         outfile: str
         """
         self.__log.debug('outfile=%s', outfile)
 
-        w_write = wave.Wave_write(outfile)
-        w_write.setparams((
-            1, 2, self._rate, len(self.wav), 'NONE', 'not compressed'))
-        w_write.writeframes(array.array('h', self.wav).tobytes())
-        w_write.close()
+        write_wav(outfile, self.wav, self._rate)
 
     def play(self, vol=DEF_VOL):
         """